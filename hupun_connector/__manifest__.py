@@ -8,7 +8,7 @@
         It provides configuration for API credentials and a base client for making API requests.
     """,
     'author': 'Your Name',
-    'depends': ['base', 'sale_management', 'stock', 'purchase'],
+    'depends': ['base', 'sale_management', 'stock', 'sale_stock', 'stock_delivery', 'purchase', 'purchase_stock'],
     'data': [
         'security/hupun_security.xml',
         'security/ir.model.access.csv',
@@ -16,9 +16,16 @@
         'data/ir_cron_data.xml',
 
         'views/res_config_settings_views.xml',
+        'views/hupun_account_views.xml',
+        'views/hupun_reference_map_views.xml',
         'views/product_views.xml',
         'views/sale_order_views.xml',
+        'views/stock_picking_views.xml',
+        'views/purchase_order_views.xml',
         'views/hupun_sync_log_views.xml',
+        'views/hupun_webhook_event_views.xml',
+        'views/hupun_refund_views.xml',
+        'views/hupun_platform_bill_views.xml',
         'views/hupun_menus.xml',
     ],
     'installable': True,
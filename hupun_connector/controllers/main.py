@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from odoo import http
+from odoo.http import request
+from ..models.hupun_request import verify
+
+_logger = logging.getLogger(__name__)
+
+# Reject pushes whose _t timestamp drifts more than this from our clock (seconds)
+SIGN_MAX_AGE = 600
+
+
+class HupunWebhookController(http.Controller):
+
+    @http.route('/hupun/webhook', type='http', auth='public', methods=['POST'], csrf=False, save_session=False)
+    def hupun_webhook(self, **kwargs):
+        """
+        Receive Hupun open-platform push messages (trade status, shipment, refund).
+        The message is only verified and queued here; the heavy lifting is done
+        by the webhook cron so Hupun gets its acknowledgement immediately.
+        """
+        params = dict(request.httprequest.form or kwargs)
+        if not params and request.httprequest.is_json:
+            params = request.httprequest.get_json(silent=True) or {}
+        params = {key: value if isinstance(value, str) else str(value) for key, value in params.items()}
+
+        env = request.env(su=True)
+        account = env['hupun.account']._for_app_key(params.get('_app'))
+        client = env['hupun.api'].with_context(hupun_account_id=account.id) if account else env['hupun.api']
+        try:
+            app_key, app_secret, _base_url = client._get_credentials()
+        except Exception as e:
+            _logger.error(f"Hupun webhook rejected, credentials not configured: {e}")
+            return request.make_json_response({'code': 1, 'message': 'not configured'}, status=503)
+
+        if params.get('_app') and params['_app'] != app_key:
+            return request.make_json_response({'code': 1, 'message': 'unknown app'}, status=403)
+        if not verify(app_secret, params, SIGN_MAX_AGE):
+            _logger.warning("Hupun webhook rejected: invalid signature")
+            return request.make_json_response({'code': 1, 'message': 'invalid sign'}, status=403)
+
+        env['hupun.webhook.event']._enqueue(params, account)
+        return request.make_json_response({'code': 0, 'message': 'success'})
@@ -5,3 +5,15 @@ from . import hupun_api
 from . import product_product
 from . import sale_order
 from . import hupun_sync_log
+from . import hupun_webhook_event
+from . import hupun_sync_state
+from . import hupun_refund
+from . import hupun_platform_bill
+from . import stock_picking
+from . import res_partner
+from . import product_template
+from . import hupun_product_outbox
+from . import purchase_order
+from . import hupun_account
+from . import hupun_reference_map
+from . import hupun_scheduler
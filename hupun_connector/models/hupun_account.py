@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from odoo import models, fields, api, tools
+
+_logger = logging.getLogger(__name__)
+
+# Accounts synchronised at the same time by one cron run
+MAX_PARALLEL_ACCOUNTS = 4
+
+
+class HupunAccount(models.Model):
+    _name = 'hupun.account'
+    _description = 'Hupun Account'
+    _order = 'company_id, name'
+
+    name = fields.Char(string='Name', required=True)
+    active = fields.Boolean(string='Active', default=True)
+    company_id = fields.Many2one('res.company', string='Company', required=True, default=lambda self: self.env.company)
+    app_key = fields.Char(string='App Key', required=True)
+    app_secret = fields.Char(string='App Secret', required=True, groups='base.group_system')
+    api_base_url = fields.Char(string='API Base URL', default='https://open-api.hupun.com/api')
+    rate_limit = fields.Float(string='Rate Limit (calls/s)', default=10.0,
+                              help='Maximum calls per second this server worker sends for this account.')
+
+    _app_key_uniq = models.Constraint('UNIQUE(app_key)', 'A Hupun app key can only be configured once.')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        accounts = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return accounts
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache('company_id')
+    def _account_id_for_company(self, company_id):
+        """Id of the active account of a company, or 0 (cached per worker)."""
+        return self.sudo().search([('company_id', '=', company_id)], limit=1).id or 0
+
+    @api.model
+    @tools.ormcache()
+    def _account_companies(self):
+        """(account id, company id) of every active account (cached per worker)."""
+        return tuple((account.id, account.company_id.id) for account in self.sudo().search([]))
+
+    @api.model
+    def _for_app_key(self, app_key):
+        return self.sudo().search([('app_key', '=', app_key)], limit=1) if app_key else self.browse()
+
+    @api.model
+    def _fan_out(self, model_name, method):
+        """
+        Run a sync cron once per active account, in parallel threads each with
+        its own cursor, company and hupun_account_id context.
+        :return: False when there is nothing to fan out (already running for an
+                 account, or no account configured), so the caller runs itself.
+        """
+        if self.env.context.get('hupun_account_id'):
+            return False
+        accounts = self.sudo().search([])
+        if not accounts:
+            return False
+
+        with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_ACCOUNTS, len(accounts))) as executor:
+            futures = {
+                executor.submit(self._run_for_account, account.id, account.company_id.id, model_name, method): account
+                for account in accounts
+            }
+        for future, account in futures.items():
+            if future.exception():
+                _logger.error(f"Hupun {model_name}.{method} failed for account {account.name}: {future.exception()}")
+        return True
+
+    def _run_for_account(self, account_id, company_id, model_name, method):
+        with self.env.registry.cursor() as cr:
+            env = api.Environment(cr, self.env.uid, dict(self.env.context, hupun_account_id=account_id))
+            model = env[model_name].with_company(company_id)
+            getattr(model, method)()
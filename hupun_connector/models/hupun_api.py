@@ -1,16 +1,37 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
 import json
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from odoo import models, api, _
 from odoo.exceptions import UserError
-from . import hupun_endpoints
+from requests import Session
+from threading import Lock
+from . import hupun_breaker, hupun_endpoints, hupun_throttle
 from .hupun_request import Request
 
 
 _logger = logging.getLogger(__name__)
 
+# Request clients per (app key, secret, base url), shared by the threads of a worker
+_CLIENTS = {}
+_CLIENTS_LOCK = Lock()
+# Seconds between two checks of the shared breaker reset request
+BREAKER_RESET_CHECK_SECONDS = 10
+_breaker_reset_checked = 0.0
+
+
+def _first(item, *keys):
+    """Return the first non-empty value among several possible Hupun keys."""
+    for key in keys:
+        value = item.get(key)
+        if value not in (None, ''):
+            return value
+    return None
+
+
 class HupunAPI(models.AbstractModel):
     _name = 'hupun.api'
     _description = 'Hupun API Client'
@@ -19,16 +40,30 @@ class HupunAPI(models.AbstractModel):
         """Returns an instance of the client with credentials loaded."""
         return self
 
+    def _get_account(self):
+        """
+        The hupun.account the current call runs for: the one set in the
+        hupun_account_id context key, else the current company's account.
+        Returns an empty recordset for single-account setups configured in settings.
+        """
+        Account = self.env['hupun.account'].sudo()
+        account_id = self.env.context.get('hupun_account_id') or Account._account_id_for_company(self.env.company.id)
+        return Account.browse(account_id or [])
+
     def _get_credentials(self):
-        ICP = self.env['ir.config_parameter'].sudo()
-        app_key = ICP.get_param('hupun_connector.app_key')
-        app_secret = ICP.get_param('hupun_connector.app_secret')
-        base_url = ICP.get_param('hupun_connector.api_base_url', 'https://open-api.hupun.com/api')
+        account = self._get_account()
+        if account:
+            app_key, app_secret, base_url = account.app_key, account.app_secret, account.api_base_url
+        else:
+            ICP = self.env['ir.config_parameter'].sudo()
+            app_key = ICP.get_param('hupun_connector.app_key')
+            app_secret = ICP.get_param('hupun_connector.app_secret')
+            base_url = ICP.get_param('hupun_connector.api_base_url', 'https://open-api.hupun.com/api')
         
         if not app_key or not app_secret:
             raise UserError(_("Hupun App Key and App Secret must be configured in settings."))
             
-        return app_key.strip(), app_secret.strip(), base_url.strip()
+        return app_key.strip(), app_secret.strip(), (base_url or 'https://open-api.hupun.com/api').strip()
 
     def make_request(self, endpoint, params=None, method='POST'):
         """
@@ -38,25 +73,116 @@ class HupunAPI(models.AbstractModel):
         :param method: HTTP method (default POST) - Note: Request class only supports POST
         :return: JSON response
         """
-        app_key, app_secret, base_url = self._get_credentials()
-        
+        return self._execute(self._get_request(), endpoint, params)
+
+    def _get_request(self):
+        """
+        Return the cached Request client of the current account.
+        Each account gets its own client and HTTP session (connection pool),
+        reused by every call of this worker process.
+        """
+        key = self._get_credentials()
+        with _CLIENTS_LOCK:
+            req = _CLIENTS.get(key)
+            if req is None:
+                app_key, app_secret, base_url = key
+                # Note: base_url usually includes /api, but Request class adds it if missing.
+                # If base_url is https://erp-open.hupun.com/api, Request class handles it.
+                req = _CLIENTS[key] = Request(base_url, app_key, app_secret).session(Session())
+        return req
+
+    # --- Shared breaker state ---
+    # Breakers live in each worker process; their transitions are published to
+    # hupun.sync.state so the settings page shows (and resets) what the cron
+    # workers see, not only the worker serving the page.
+    @api.model
+    def _publish_breakers(self):
+        """Write the breakers that changed state in this process to the shared store."""
+        changed = hupun_breaker.pop_changed()
+        if not changed:
+            return
+        try:
+            # Own short transaction: survives a rollback of the caller and holds no lock
+            with self.env.registry.cursor() as cr:
+                State = self.env(cr=cr)['hupun.sync.state']
+                for breaker in changed:
+                    State._set_value(f"breaker.{breaker['name']}", json.dumps(breaker))
+        except Exception as e:
+            _logger.warning(f"Could not publish Hupun breaker state: {e}")
+
+    @api.model
+    def _apply_breaker_reset(self):
+        """Apply a reset requested from another worker, checked at most every few seconds."""
+        global _breaker_reset_checked
+        now = time.time()
+        if now - _breaker_reset_checked < BREAKER_RESET_CHECK_SECONDS:
+            return
+        _breaker_reset_checked = now
+        reset_at = self.env['hupun.sync.state']._get_value('breaker.reset_at')
+        if reset_at:
+            hupun_breaker.apply_reset(float(reset_at))
+
+    @api.model
+    def _shared_breakers(self):
+        """Last published state of every breaker, across all worker processes."""
+        self.env.cr.execute(
+            "SELECT value FROM hupun_sync_state WHERE key LIKE %s AND key != 'breaker.reset_at' ORDER BY key", ('breaker.%',))
+        return [json.loads(row[0]) for row in self.env.cr.fetchall() if row[0]]
+
+    @api.model
+    def _reset_shared_breakers(self):
+        """Reset every breaker: this process now, the other workers on their next call."""
+        State = self.env['hupun.sync.state']
+        State._set_value('breaker.reset_at', repr(time.time()))
+        for breaker in self._shared_breakers():
+            State._set_value(f"breaker.{breaker['name']}", json.dumps(
+                dict(breaker, state=hupun_breaker.CLOSED, failures=0, last_error=None)))
+        hupun_breaker.reset_all()
+        hupun_breaker.pop_changed()
+
+    def _execute(self, req, endpoint, params=None):
+        """Execute a call on an already built Request client."""
+        return self._read_response(self._sender(req, endpoint, params))
+
+    def _sender(self, req, endpoint, params=None):
+        """
+        Build the callable performing the HTTP call, guarded by the circuit
+        breaker of the endpoint family and using that family's timeout.
+        The callable returns the decoded JSON answer; HTTP 5xx, empty and
+        non-JSON bodies count as breaker failures like transport errors.
+        It does not touch the environment and may run in a thread.
+        """
         if params is None:
             params = {}
-            
-        # Initialize the official Request class
-        # Note: base_url usually includes /api, but Request class adds it if missing.
-        # If base_url is https://erp-open.hupun.com/api, Request class handles it.
-        req = Request(base_url, app_key, app_secret)
-        
+        self._apply_breaker_reset()
+        breaker = hupun_breaker.get_breaker(endpoint)
+        timeout = hupun_breaker.timeout_for(endpoint)
+        bucket = hupun_throttle.get_bucket(req._app, self._get_account().rate_limit)
+
+        def send():
+            breaker.before_call()
+            bucket.acquire()
+            try:
+                response_text = req.request(endpoint, params, timeout)
+                if not response_text:
+                    raise ValueError("Empty response from Hupun API.")
+                result = json.loads(response_text)
+            except Exception as e:
+                breaker.record_failure(e)
+                raise
+            breaker.record_success()
+            return result
+        return send
+
+    def _read_response(self, send):
+        """
+        Run a request built by _sender and return its decoded JSON answer.
+        :param send: callable from _sender; may also be the result() of a
+                     future so transport and decoding errors surface here
+        """
         try:
-            # Execute request
-            # The Request.request method returns the response text
-            response_text = req.request(endpoint, params)
-            
-            if not response_text:
-                 raise UserError(_("Empty response from Hupun API."))
-            
-            result = json.loads(response_text)
+            # Execute request, the sender already decodes the response text
+            result = send()
             
             _logger.info(f"Hupun API Response: {result}")
             
@@ -66,6 +192,91 @@ class HupunAPI(models.AbstractModel):
             _logger.error(f"Hupun API Request Failed: {e}")
             raise UserError(_("Failed to connect to Hupun API: %s") % str(e))
 
+        finally:
+            self._publish_breakers()
+
+    @api.model
+    def _response_items(self, response):
+        """Extract the record list from a Hupun response ({'data': {'list': [...]}} or {'data': [...]})."""
+        data = response.get('data') if response else None
+        if isinstance(data, dict) and 'list' in data:
+            return data['list'] or []
+        elif isinstance(data, list):
+            return data
+        return []
+
+    def _iter_pages(self, endpoint, params, page_size=200, prefetch=False):
+        """
+        Page through a Hupun list endpoint.
+        Yields (page, response, items) until a short or empty page is returned.
+        :param prefetch: download the next page in a background thread while
+                         the caller processes the current one. Only the HTTP
+                         call runs in that thread, never any ORM code.
+        :raise UserError: when Hupun answers with a non-zero code
+        """
+        req = self._get_request()
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            page = 1
+            pending = None
+            while True:
+                if pending:
+                    response = self._read_response(pending.result)
+                else:
+                    response = self._execute(req, endpoint, dict(params, page=page, limit=page_size))
+                if response.get('code') != 0:
+                    raise UserError(_("Hupun API error: %s") % response.get('message'))
+                items = self._response_items(response)
+                last = len(items) < page_size
+                pending = None
+                if executor and not last:
+                    pending = executor.submit(self._sender(req, endpoint, dict(params, page=page + 1, limit=page_size)))
+                yield page, response, items
+                if last:
+                    break
+                page += 1
+        finally:
+            if executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    # --- Change detection ---
+    @api.model
+    def _state_key(self, key):
+        """Namespace a sync state key by account, so every account keeps its own cursors."""
+        account = self._get_account()
+        return f'account.{account.id}.{key}' if account else key
+
+    @api.model
+    def _fingerprint(self, record):
+        """Stable hash of a normalised Hupun record (key order and formatting independent)."""
+        normalised = json.dumps(record, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+        return hashlib.sha1(normalised.encode('utf-8')).hexdigest()
+
+    @api.model
+    def _page_fingerprint(self, stream, page, items):
+        """
+        Fingerprint a page of a sync stream.
+        :return: tuple (unchanged, fingerprint); pass the fingerprint to
+                 _store_page_fingerprint once the page was imported without errors.
+        """
+        fingerprint = self._fingerprint(items)
+        stored = self.env['hupun.sync.state']._get_value(self._state_key(f'fingerprint.{stream}.{page}'))
+        return stored == fingerprint, fingerprint
+
+    @api.model
+    def _store_page_fingerprint(self, stream, page, fingerprint):
+        self.env['hupun.sync.state']._set_value(self._state_key(f'fingerprint.{stream}.{page}'), fingerprint)
+
+    # --- Incremental cursors ---
+    @api.model
+    def _get_cursor(self, stream, default=None):
+        """Last high-water mark (usually a modify time string) of an incremental sync stream."""
+        return self.env['hupun.sync.state']._get_value(self._state_key(f'cursor.{stream}'), default)
+
+    @api.model
+    def _set_cursor(self, stream, value):
+        self.env['hupun.sync.state']._set_value(self._state_key(f'cursor.{stream}'), value)
+
     # --- Base Info API (基础信息接口) ---
     def shop_query(self, params=None):
         """Query shop information (erp/base/shop/page/get)"""
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from typing import Dict, List
+
+__all__ = ['CircuitOpenError', 'CircuitBreaker', 'get_breaker', 'timeout_for', 'snapshot', 'reset_all',
+           'pop_changed', 'apply_reset']
+
+# Consecutive transport failures (errors or timeouts) that open a breaker
+FAILURE_THRESHOLD = 5
+# Seconds an open breaker waits before letting a half-open probe through
+RESET_TIMEOUT = 30
+
+# Per endpoint family timeouts (seconds), tuned to each family's normal latency
+DEFAULT_TIMEOUT = 30
+TIMEOUTS = {
+    'erp/base': 10,
+    'erp/goods': 20,
+    'erp/stock': 20,
+    'erp/opentrade': 20,
+    'erp/trade': 20,
+    'erp/logistic': 15,
+    'erp/purchase': 30,
+    'erp/refund': 30,
+    'erp/bi': 60,
+}
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Hupun while the endpoint family's breaker is open."""
+
+
+class CircuitBreaker:
+    """熔断器 (每个接口族一个, 进程内共享)"""
+
+    def __init__(self, name: str, threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error = None
+        self.changed = False
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            self.changed = True
+
+    def as_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'state': self.state,
+            'failures': self.failures,
+            'opened_at': self.opened_at,
+            'last_error': self.last_error,
+        }
+
+    def before_call(self):
+        """
+        Check the breaker before a call.
+        :raise CircuitOpenError: while open, or while a half-open probe is in flight
+        """
+        with self._lock:
+            if self.state == OPEN:
+                if time.time() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError(f'circuit open for {self.name}: {self.last_error}')
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    raise CircuitOpenError(f'circuit half-open for {self.name}, probe in progress')
+                self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._set_state(CLOSED)
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)[:200]
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                if self.state != OPEN:
+                    self.opened_at = time.time()
+                self._set_state(OPEN)
+            self._probing = False
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_LOCK = threading.Lock()
+# Time of the last shared reset applied by this process
+_reset_applied = 0.0
+
+
+def family(endpoint: str) -> str:
+    """
+    接口族, 如 /erp/goods/spec/open/query/goodswithspeclist -> erp/goods
+    :param endpoint: 接口路径
+    """
+    parts = [p for p in (endpoint or '').split('/') if p]
+    return '/'.join(parts[:2])
+
+
+def get_breaker(endpoint: str) -> CircuitBreaker:
+    name = family(endpoint)
+    with _LOCK:
+        breaker = _BREAKERS.get(name)
+        if breaker is None:
+            breaker = _BREAKERS[name] = CircuitBreaker(name)
+        return breaker
+
+
+def timeout_for(endpoint: str) -> float:
+    return TIMEOUTS.get(family(endpoint), DEFAULT_TIMEOUT)
+
+
+def snapshot() -> List[Dict]:
+    """State of every breaker used by this process."""
+    with _LOCK:
+        breakers = list(_BREAKERS.values())
+    return [b.as_dict() for b in sorted(breakers, key=lambda b: b.name)]
+
+
+def pop_changed() -> List[Dict]:
+    """
+    状态有变化的熔断器 (取出后清除标记), 供发布到共享存储
+    """
+    changed = []
+    with _LOCK:
+        breakers = list(_BREAKERS.values())
+    for breaker in breakers:
+        with breaker._lock:
+            if breaker.changed:
+                breaker.changed = False
+                changed.append(breaker.as_dict())
+    return changed
+
+
+def reset_all():
+    with _LOCK:
+        for breaker in _BREAKERS.values():
+            breaker.record_success()
+
+
+def apply_reset(reset_at: float):
+    """
+    应用共享存储中的重置请求 (每个请求每个进程只应用一次)
+    :param reset_at: 重置请求时间戳
+    """
+    global _reset_applied
+    if reset_at > _reset_applied:
+        _reset_applied = reset_at
+        reset_all()
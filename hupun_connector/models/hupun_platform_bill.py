@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import logging
+from psycopg2.extras import execute_values
+from odoo import models, fields, api, _
+from . import hupun_endpoints
+from .hupun_api import _first
+
+_logger = logging.getLogger(__name__)
+
+# Size of one incremental ingest window and how far back the first run starts
+WINDOW_DAYS = 1
+INITIAL_WINDOW_DAYS = 31
+# Bills keep being adjusted by the platforms for a while, re-read this margin every run
+SETTLEMENT_LAG_HOURS = 2
+PAGE_SIZE = 500
+
+
+class HupunPlatformBill(models.Model):
+    """
+    Raw platform bill lines. Append-only and written through bulk SQL,
+    which is why access fields are disabled and there is no ORM create path.
+    """
+    _name = 'hupun.platform.bill'
+    _description = 'Hupun Platform Bill Line'
+    _order = 'bill_date desc, id desc'
+    _log_access = False
+    _rec_name = 'bill_key'
+
+    bill_key = fields.Char(string='Bill Key', required=True, readonly=True)
+    account_id = fields.Many2one('hupun.account', string='Hupun Account', readonly=True, ondelete='restrict')
+    bill_date = fields.Date(string='Bill Date', required=True, readonly=True)
+    shop_code = fields.Char(string='Shop', readonly=True)
+    trade_no = fields.Char(string='Trade No', readonly=True, index='btree_not_null')
+    fee_type = fields.Char(string='Fee Type', readonly=True)
+    amount = fields.Float(string='Amount', readonly=True)
+
+    # Bill ids are only unique within one Hupun account; no account means the settings credentials
+    _bill_key_uniq = models.UniqueIndex('(COALESCE(account_id, 0), bill_key)', 'Hupun platform bill lines must be unique.')
+    _bill_date_shop_idx = models.Index('(bill_date, shop_code)')
+
+    @api.model
+    def _prepare_bill_row(self, item, account_id=None):
+        """Map a Hupun bill line of an account to a row tuple, or None when it cannot be dated."""
+        client = self.env['hupun.api']
+        bill_time = _first(item, 'bill_time', 'bill_date', 'create_time', 'modified')
+        try:
+            bill_date = fields.Date.to_date(str(bill_time)[:10])
+        except (TypeError, ValueError):
+            bill_date = None
+        if not bill_date:
+            return None
+        try:
+            amount = float(_first(item, 'amount', 'fee', 'money') or 0)
+        except (TypeError, ValueError):
+            amount = 0.0
+        bill_key = _first(item, 'bill_id', 'id', 'bill_no') or client._fingerprint(item)
+        return (
+            str(bill_key),
+            account_id,
+            bill_date,
+            _first(item, 'shop_code', 'shop_nick', 'shop_name') or '',
+            _first(item, 'trade_no', 'tp_tid'),
+            _first(item, 'fee_type', 'account_type', 'type') or '',
+            amount,
+        )
+
+    @api.model
+    def _bulk_insert(self, rows):
+        """Insert bill rows, ignoring lines already stored. Returns the number of new rows."""
+        if not rows:
+            return 0
+        execute_values(self.env.cr._obj, """
+            INSERT INTO hupun_platform_bill (bill_key, account_id, bill_date, shop_code, trade_no, fee_type, amount)
+            VALUES %s
+            ON CONFLICT (COALESCE(account_id, 0), bill_key) DO NOTHING
+        """, rows, page_size=len(rows))
+        return self.env.cr.rowcount
+
+    @api.model
+    def cron_sync_hupun_platform_bills(self):
+        """
+        Cron job streaming platform bills into hupun_platform_bill.
+        Works through fixed date windows from the stored cursor up to now and
+        commits after each window, so an interrupted run resumes where it stopped.
+        """
+        if self.env['hupun.account']._fan_out('hupun.platform.bill', 'cron_sync_hupun_platform_bills'):
+            return
+
+        client = self.env['hupun.api']
+        account_id = client._get_account().id or None
+        Daily = self.env['hupun.platform.bill.daily']
+        sync_log = self.env['hupun.sync.log'].create({
+            'name': f'Platform Bill Sync {fields.Datetime.now()}',
+            'sync_type': 'platform_bill',
+            'status': 'running',
+        })
+        # Windows commit one by one: the log must already be committed so a
+        # rollback of a failing window cannot take it along
+        self.env.cr.commit()
+        detail_logs = []
+        inserted_count = fetched_count = 0
+        _logger.info("===== Hupun Platform Bill Sync Started =====")
+
+        try:
+            now = fields.Datetime.now()
+            cursor = client._get_cursor('platform_bill')
+            window_start = fields.Datetime.to_datetime(cursor) if cursor else now - datetime.timedelta(days=INITIAL_WINDOW_DAYS)
+            window_start -= datetime.timedelta(hours=SETTLEMENT_LAG_HOURS)
+
+            while window_start < now:
+                window_end = min(window_start + datetime.timedelta(days=WINDOW_DAYS), now)
+                request_data = {
+                    'start_time': fields.Datetime.to_string(window_start),
+                    'end_time': fields.Datetime.to_string(window_end),
+                }
+                touched_dates = set()
+                window_inserted = 0
+                for page, response, items in client._iter_pages(hupun_endpoints.PLATFORM_BILL_QUERY, request_data, PAGE_SIZE):
+                    rows = [row for row in (self._prepare_bill_row(item, account_id) for item in items) if row]
+                    fetched_count += len(items)
+                    window_inserted += self._bulk_insert(rows)
+                    touched_dates.update(row[2] for row in rows)
+
+                Daily._refresh_dates(touched_dates, account_id)
+                client._set_cursor('platform_bill', fields.Datetime.to_string(window_end))
+                self.env.cr.commit()
+
+                inserted_count += window_inserted
+                detail_logs.append(f"{request_data['start_time']} - {request_data['end_time']}: {window_inserted} new lines")
+                window_start = window_end
+
+            summary = f"Fetched: {fetched_count}, Inserted: {inserted_count}"
+            sync_log.write({
+                'status': 'success',
+                'end_time': fields.Datetime.now(),
+                'summary': summary,
+                'details': '\n'.join(detail_logs),
+            })
+            _logger.info(f"===== Hupun Platform Bill Sync Completed: {summary} =====")
+
+        except Exception as e:
+            self.env.cr.rollback()
+            error_msg = f"Error syncing Hupun platform bills: {e}"
+            _logger.error(error_msg)
+            sync_log.write({
+                'status': 'partial' if inserted_count else 'failed',
+                'end_time': fields.Datetime.now(),
+                'summary': error_msg,
+                'details': '\n'.join(detail_logs),
+            })
+
+
+class HupunPlatformBillDaily(models.Model):
+    """
+    Daily totals per account, shop and fee type, rebuilt for the days touched
+    by each ingest window so reports never have to scan the raw bill lines.
+    Each account only rebuilds its own rows, so accounts synced in parallel
+    never touch the same summary lines.
+    """
+    _name = 'hupun.platform.bill.daily'
+    _description = 'Hupun Platform Bill Daily Summary'
+    _order = 'bill_date desc, shop_code, fee_type'
+    _log_access = False
+    _rec_name = 'bill_date'
+
+    bill_date = fields.Date(string='Bill Date', required=True, readonly=True, index=True)
+    account_id = fields.Many2one('hupun.account', string='Hupun Account', readonly=True, ondelete='restrict')
+    shop_code = fields.Char(string='Shop', readonly=True)
+    fee_type = fields.Char(string='Fee Type', readonly=True)
+    amount = fields.Float(string='Amount', readonly=True, aggregator='sum')
+    line_count = fields.Integer(string='Lines', readonly=True, aggregator='sum')
+
+    _day_uniq = models.UniqueIndex('(COALESCE(account_id, 0), bill_date, shop_code, fee_type)', 'Daily bill summaries must be unique.')
+
+    @api.model
+    def _refresh_dates(self, dates, account_id=None):
+        if not dates:
+            return
+        dates = tuple(dates)
+        self.env.cr.execute("""
+            DELETE FROM hupun_platform_bill_daily
+             WHERE bill_date IN %s AND account_id IS NOT DISTINCT FROM %s
+        """, (dates, account_id))
+        self.env.cr.execute("""
+            INSERT INTO hupun_platform_bill_daily (bill_date, account_id, shop_code, fee_type, amount, line_count)
+            SELECT bill_date, account_id, shop_code, fee_type, SUM(amount), COUNT(*)
+              FROM hupun_platform_bill
+             WHERE bill_date IN %s AND account_id IS NOT DISTINCT FROM %s
+          GROUP BY bill_date, account_id, shop_code, fee_type
+        """, (dates, account_id))
+        self.invalidate_model()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Products pushed per worker run
+OUTBOX_BATCH_SIZE = 200
+# Failed rows are retried on each run until this many attempts
+MAX_ATTEMPTS = 5
+# Claims older than this belong to a worker that died mid-run and are taken over
+CLAIM_TIMEOUT_MINUTES = 120
+
+
+class HupunProductOutbox(models.Model):
+    """
+    Products waiting to be pushed to Hupun.
+    Rows are written in the same transaction as the product change and
+    coalesced to one row per product and Hupun account, so a burst of edits
+    costs one push per account. Without configured accounts rows carry no
+    account and are pushed with the settings credentials.
+    """
+    _name = 'hupun.product.outbox'
+    _description = 'Hupun Product Outbox'
+    _order = 'queued_at, id'
+    _log_access = False
+    _rec_name = 'product_id'
+
+    product_id = fields.Many2one('product.product', string='Product', required=True, readonly=True, ondelete='cascade')
+    account_id = fields.Many2one('hupun.account', string='Hupun Account', readonly=True, ondelete='cascade')
+    queued_at = fields.Datetime(string='Queued At', required=True, readonly=True)
+    attempts = fields.Integer(string='Attempts', readonly=True)
+    last_error = fields.Char(string='Last Error', readonly=True)
+    claimed_at = fields.Datetime(string='Claimed At', readonly=True)
+
+    _product_uniq = models.UniqueIndex('(product_id, COALESCE(account_id, 0))', 'A product can only be queued once per account.')
+
+    @api.model
+    def _enqueue(self, products):
+        products = products.filtered('default_code')
+        if not products:
+            return
+        # One row per account the product belongs to: shared products go to every account
+        accounts = self.env['hupun.account']._account_companies()
+        pairs = [
+            (product.id, account_id)
+            for product in products
+            for account_id, company_id in (accounts or [(None, None)])
+            if not account_id or not product.company_id or product.company_id.id == company_id
+        ]
+        if not pairs:
+            return
+        product_ids, account_ids = zip(*pairs)
+        self.env.cr.execute("""
+            INSERT INTO hupun_product_outbox (product_id, account_id, queued_at, attempts)
+            SELECT product_id, account_id, now() at time zone 'UTC', 0
+              FROM unnest(%s::int[], %s::int[]) AS t (product_id, account_id)
+            ON CONFLICT (product_id, COALESCE(account_id, 0))
+            DO UPDATE SET queued_at = EXCLUDED.queued_at, attempts = 0, last_error = NULL
+        """, (list(product_ids), list(account_ids)))
+
+    @api.model
+    def cron_drain_hupun_product_outbox(self):
+        """
+        Worker pushing queued products to Hupun.
+        Rows are claimed and the claim committed before any HTTP call, so
+        product saves queueing the same rows never wait on the push. A row is
+        only removed if the product was not queued again while the push was
+        running; failed rows stay until MAX_ATTEMPTS is reached.
+        Fanned out per account, each run only drains its own account's rows.
+        """
+        if self.env['hupun.account']._fan_out('hupun.product.outbox', 'cron_drain_hupun_product_outbox'):
+            return
+
+        account_id = self.env['hupun.api']._get_account().id or None
+        self.env.cr.execute("""
+            UPDATE hupun_product_outbox SET claimed_at = now() at time zone 'UTC'
+             WHERE id IN (
+                SELECT id FROM hupun_product_outbox
+                 WHERE attempts < %s AND account_id IS NOT DISTINCT FROM %s
+                   AND (claimed_at IS NULL OR claimed_at < now() at time zone 'UTC' - make_interval(mins => %s))
+              ORDER BY queued_at, id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED)
+         RETURNING id, product_id, queued_at
+        """, (MAX_ATTEMPTS, account_id, CLAIM_TIMEOUT_MINUTES, OUTBOX_BATCH_SIZE))
+        rows = self.env.cr.fetchall()
+        self.env.cr.commit()
+        if not rows:
+            return
+
+        products = self.env['product.product'].with_context(active_test=False).browse([row[1] for row in rows]).exists()
+        log = self.env['hupun.sync.log'].create({
+            'name': f'Product Outbox {fields.Datetime.now()}',
+            'sync_type': 'product',
+            'status': 'running',
+        })
+        details = []
+        pushed, failed = products._hupun_push(details)
+
+        done = [(row[0], row[2]) for row in rows if row[1] in pushed.ids or row[1] not in products.ids]
+        for outbox_id, queued_at in done:
+            self.env.cr.execute(
+                "DELETE FROM hupun_product_outbox WHERE id = %s AND queued_at = %s", (outbox_id, queued_at))
+        for outbox_id, product_id, queued_at in rows:
+            if product_id in failed:
+                self.env.cr.execute("""
+                    UPDATE hupun_product_outbox SET attempts = attempts + 1, last_error = %s
+                     WHERE id = %s AND queued_at = %s
+                """, (failed[product_id][:255], outbox_id, queued_at))
+        # Release what is left: failed rows and rows queued again during the push
+        self.env.cr.execute(
+            "UPDATE hupun_product_outbox SET claimed_at = NULL WHERE id IN %s", (tuple(row[0] for row in rows),))
+        self.invalidate_model()
+
+        log.write({'details': '\n'.join(details)})
+        if not failed:
+            log.mark_success(f"Pushed {len(pushed)} products")
+        elif not pushed:
+            log.mark_failed(f"All {len(failed)} products failed to push")
+        else:
+            log.write({
+                'status': 'partial',
+                'end_time': fields.Datetime.now(),
+                'summary': f"Pushed {len(pushed)} products, {len(failed)} failed",
+            })
+
+        if len(rows) == OUTBOX_BATCH_SIZE:
+            self.env.ref('hupun_connector.ir_cron_drain_hupun_product_outbox')._trigger()
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from odoo import models, fields, api, tools
+from . import hupun_endpoints
+from .hupun_api import _first
+
+_logger = logging.getLogger(__name__)
+
+# kind -> (endpoint, code keys, name keys, mapped field)
+REFERENCE_KINDS = {
+    'storage': (hupun_endpoints.STORAGE_QUERY, ('storage_code', 'code'), ('storage_name', 'name'), 'warehouse_id'),
+    'shop': (hupun_endpoints.SHOP_QUERY, ('shop_code', 'shop_id', 'code'), ('shop_name', 'shop_nick', 'name'), 'team_id'),
+    'supplier': (hupun_endpoints.SUPPLIER_QUERY, ('supplier_code', 'code'), ('supplier_name', 'name'), 'partner_id'),
+}
+
+
+class HupunReferenceMap(models.Model):
+    """
+    Mapping between Hupun storage, shop and supplier codes and Odoo records.
+    Lookups go through a per-worker ormcache that is cleared (in all workers)
+    whenever a mapping changes, so resolving a code in a loop costs a dict lookup.
+    """
+    _name = 'hupun.reference.map'
+    _description = 'Hupun Reference Mapping'
+    _order = 'kind, code'
+
+    kind = fields.Selection([
+        ('storage', 'Storage'),
+        ('shop', 'Shop'),
+        ('supplier', 'Supplier'),
+    ], string='Type', required=True)
+    code = fields.Char(string='Hupun Code', required=True)
+    name = fields.Char(string='Hupun Name')
+    account_id = fields.Many2one('hupun.account', string='Hupun Account', ondelete='cascade')
+    warehouse_id = fields.Many2one('stock.warehouse', string='Warehouse', ondelete='set null')
+    team_id = fields.Many2one('crm.team', string='Sales Team', ondelete='set null')
+    partner_id = fields.Many2one('res.partner', string='Supplier', ondelete='set null')
+
+    _kind_code_uniq = models.UniqueIndex('(kind, code, COALESCE(account_id, 0))')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache('kind', 'account_id')
+    def _get_code_map(self, kind, account_id):
+        """Hupun code -> mapped record id for one kind and account (cached per worker)."""
+        field_name = REFERENCE_KINDS[kind][3]
+        self.env.cr.execute(f"""
+            SELECT code, {field_name} FROM hupun_reference_map
+             WHERE kind = %s AND COALESCE(account_id, 0) = %s AND {field_name} IS NOT NULL
+        """, (kind, account_id or 0))
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    @tools.ormcache('kind', 'account_id')
+    def _get_record_map(self, kind, account_id):
+        """Mapped record id -> Hupun code for one kind and account (cached per worker)."""
+        return {res_id: code for code, res_id in self._get_code_map(kind, account_id).items()}
+
+    @api.model
+    def _current_account_id(self):
+        return self.env['hupun.api']._get_account().id or 0
+
+    @api.model
+    def _resolve(self, kind, code):
+        """Odoo record mapped to a Hupun code, or an empty recordset."""
+        field_name = REFERENCE_KINDS[kind][3]
+        res_id = self._get_code_map(kind, self._current_account_id()).get(code)
+        return self.env[self._fields[field_name].comodel_name].browse(res_id)
+
+    @api.model
+    def _code_for(self, kind, record):
+        """Hupun code mapped to an Odoo record, or None."""
+        return self._get_record_map(kind, self._current_account_id()).get(record.id) if record else None
+
+    @api.model
+    def _auto_match(self, kind, codes_names):
+        """Suggest Odoo records for new codes: warehouses by code, teams by name, suppliers by ref."""
+        if kind == 'storage':
+            records = self.env['stock.warehouse'].search([('code', 'in', list(codes_names))])
+            by_key = {warehouse.code: warehouse.id for warehouse in records}
+            return {code: by_key.get(code) for code in codes_names}
+        if kind == 'shop':
+            records = self.env['crm.team'].search([('name', 'in', [name for name in codes_names.values() if name])])
+            by_key = {team.name: team.id for team in records}
+            return {code: by_key.get(name) for code, name in codes_names.items()}
+        records = self.env['res.partner'].search([('ref', 'in', list(codes_names))])
+        by_key = {partner.ref: partner.id for partner in records}
+        return {code: by_key.get(code) for code in codes_names}
+
+    @api.model
+    def _hupun_reconcile_kind(self, kind, details):
+        """Page through one reference endpoint and upsert its mappings."""
+        client = self.env['hupun.api']
+        endpoint, code_keys, name_keys, field_name = REFERENCE_KINDS[kind]
+        account_id = self._current_account_id() or False
+        created_count = updated_count = 0
+
+        for page, response, items in client._iter_pages(endpoint, {}):
+            codes_names = {}
+            for item in items:
+                code = _first(item, *code_keys)
+                if code:
+                    codes_names[str(code)] = _first(item, *name_keys)
+            if not codes_names:
+                continue
+
+            existing = {
+                mapping.code: mapping
+                for mapping in self.search([('kind', '=', kind), ('account_id', '=', account_id), ('code', 'in', list(codes_names))])
+            }
+            for code, mapping in existing.items():
+                if mapping.name != codes_names[code]:
+                    mapping.name = codes_names[code]
+                    updated_count += 1
+
+            new = {code: name for code, name in codes_names.items() if code not in existing}
+            if new:
+                matches = self._auto_match(kind, new)
+                self.create([{
+                    'kind': kind,
+                    'code': code,
+                    'name': name,
+                    'account_id': account_id,
+                    field_name: matches.get(code) or False,
+                } for code, name in new.items()])
+                created_count += len(new)
+
+        details.append(f"{kind}: {created_count} new, {updated_count} renamed")
+        return created_count, updated_count
+
+    @api.model
+    def cron_reconcile_hupun_references(self):
+        """
+        Cron job reconciling Hupun storages, shops and suppliers with their mappings.
+        """
+        if self.env['hupun.account']._fan_out('hupun.reference.map', 'cron_reconcile_hupun_references'):
+            return
+
+        sync_log = self.env['hupun.sync.log'].create({
+            'name': f'Reference Reconcile {fields.Datetime.now()}',
+            'sync_type': 'reference',
+            'status': 'running',
+        })
+        details = []
+        try:
+            for kind in REFERENCE_KINDS:
+                self._hupun_reconcile_kind(kind, details)
+            unmapped = self.search_count([('warehouse_id', '=', False), ('team_id', '=', False), ('partner_id', '=', False)])
+            if unmapped:
+                details.append(f"{unmapped} codes still need a manual mapping")
+            sync_log.write({'details': '\n'.join(details)})
+            sync_log.mark_success('; '.join(details))
+        except Exception as e:
+            error_msg = f"Error reconciling Hupun references: {e}"
+            _logger.error(error_msg)
+            sync_log.write({'details': '\n'.join(details)})
+            sync_log.mark_failed(error_msg)
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import logging
+from odoo import models, fields, api, _
+from odoo.tools import float_compare
+from . import hupun_endpoints
+from .hupun_api import _first
+from .hupun_scheduler import adaptive
+
+_logger = logging.getLogger(__name__)
+
+# How far back the very first refund sync looks
+INITIAL_WINDOW_DAYS = 30
+# Hupun refund statuses meaning the money went back to the buyer
+REFUND_DONE_KEYS = ('success', 'finish', 'complete', '成功', '完成')
+
+
+class HupunRefund(models.Model):
+    _name = 'hupun.refund'
+    _description = 'Hupun Refund'
+    _order = 'hupun_modified desc, id desc'
+
+    name = fields.Char(string='Refund No', required=True, readonly=True)
+    account_id = fields.Many2one('hupun.account', string='Hupun Account', readonly=True, ondelete='restrict')
+    trade_no = fields.Char(string='Trade No', index=True, readonly=True)
+    sale_order_id = fields.Many2one('sale.order', string='Sale Order', index='btree_not_null', ondelete='set null')
+    status = fields.Char(string='Hupun Status', readonly=True)
+    refund_type = fields.Char(string='Refund Type', readonly=True)
+    amount = fields.Float(string='Refund Amount', readonly=True)
+    reason = fields.Char(string='Reason', readonly=True)
+    hupun_modified = fields.Datetime(string='Modified in Hupun', readonly=True)
+    hupun_fingerprint = fields.Char(string='Hupun Fingerprint', readonly=True, copy=False)
+    credit_note_id = fields.Many2one('account.move', string='Credit Note', readonly=True, copy=False,
+                                     index='btree_not_null', ondelete='set null')
+
+    # Refund numbers are only unique within one Hupun account; no account means the settings credentials
+    _name_uniq = models.UniqueIndex('(COALESCE(account_id, 0), name)', 'Hupun refund numbers must be unique.')
+
+    @api.model
+    def _prepare_refund_vals(self, item):
+        try:
+            modified = fields.Datetime.to_datetime(_first(item, 'modified', 'modify_time')) or False
+        except (TypeError, ValueError):
+            modified = False
+        try:
+            amount = float(_first(item, 'refund_fee', 'refund_amount', 'amount') or 0)
+        except (TypeError, ValueError):
+            amount = 0.0
+        return {
+            'name': _first(item, 'refund_no', 'refund_code', 'refund_id'),
+            'trade_no': _first(item, 'trade_no', 'tp_tid'),
+            'status': _first(item, 'status', 'refund_status'),
+            'refund_type': _first(item, 'refund_type', 'type'),
+            'amount': amount,
+            'reason': _first(item, 'reason', 'refund_reason'),
+            'hupun_modified': modified,
+        }
+
+    @api.model
+    def _hupun_import_refunds(self, items, detail_logs):
+        """
+        Upsert a batch of Hupun refunds and link them to their sale orders.
+        Refunds and orders of the batch are each resolved with a single query.
+        :return: tuple (created, updated, skipped, errors)
+        """
+        client = self.env['hupun.api']
+        account_id = client._get_account().id or False
+        created_count = updated_count = skipped_count = error_count = 0
+
+        rows = []
+        for item in items:
+            vals = self._prepare_refund_vals(item)
+            if not vals['name']:
+                skipped_count += 1
+                detail_logs.append("Skipped refund with no refund number")
+                continue
+            vals['hupun_fingerprint'] = client._fingerprint(item)
+            vals['account_id'] = account_id
+            rows.append(vals)
+        if not rows:
+            return created_count, updated_count, skipped_count, error_count
+
+        existing = {
+            refund.name: refund
+            for refund in self.search([('account_id', '=', account_id), ('name', 'in', [vals['name'] for vals in rows])])
+        }
+        trade_nos = list({vals['trade_no'] for vals in rows if vals['trade_no']})
+        orders_by_trade = {
+            trade_no: order.id
+            for trade_no, order in self.env['sale.order']._hupun_orders_by_trade(trade_nos).items()
+        }
+
+        to_create = {}
+        for vals in rows:
+            vals['sale_order_id'] = orders_by_trade.get(vals['trade_no'], False)
+            refund = existing.get(vals['name'])
+            if not refund:
+                # Later occurrences of the same refund in one batch win
+                to_create[vals['name']] = vals
+                continue
+            if refund.hupun_fingerprint == vals['hupun_fingerprint'] and refund.sale_order_id.id == vals['sale_order_id']:
+                skipped_count += 1
+                continue
+            try:
+                refund.write(vals)
+                updated_count += 1
+            except Exception as e:
+                error_count += 1
+                detail_logs.append(f"Failed to update refund {vals['name']}: {e}")
+                _logger.error(f"Failed to update Hupun refund {vals['name']}: {e}")
+
+        if to_create:
+            try:
+                with self.env.cr.savepoint():
+                    self.create(list(to_create.values()))
+                created_count += len(to_create)
+            except Exception as e:
+                error_count += len(to_create)
+                detail_logs.append(f"Failed to create {len(to_create)} refunds: {e}")
+                _logger.error(f"Failed to create Hupun refunds: {e}")
+
+        unmatched = sum(1 for vals in rows if vals['trade_no'] and not vals['sale_order_id'])
+        if unmatched:
+            detail_logs.append(f"{unmatched} refunds reference trades not found in Odoo")
+
+        if created_count or updated_count:
+            self._hupun_credit_refunded_orders(
+                self.env['sale.order'].browse({vals['sale_order_id'] for vals in rows if vals['sale_order_id']}),
+                detail_logs)
+        return created_count, updated_count, skipped_count, error_count
+
+    @api.model
+    def _is_done_status(self, status):
+        status = str(status or '').lower()
+        return any(key in status for key in REFUND_DONE_KEYS)
+
+    @api.model
+    def _hupun_credit_refunded_orders(self, orders, detail_logs):
+        """
+        Create a draft credit note for each order fully refunded in Hupun.
+        Only the simple case is handled: one posted customer invoice, no
+        credit note yet, and completed refunds covering its total. Partial
+        refunds and multi-invoice orders are left to the returns team.
+        :return: number of credit notes created
+        """
+        credited = 0
+        for order in orders:
+            refunds = order.hupun_refund_ids.filtered(lambda r: self._is_done_status(r.status))
+            if not refunds or refunds.credit_note_id:
+                continue
+            invoices = order.invoice_ids.filtered(lambda m: m.state == 'posted')
+            invoice = invoices.filtered(lambda m: m.move_type == 'out_invoice')
+            if len(invoice) != 1 or invoices.filtered(lambda m: m.move_type == 'out_refund'):
+                continue
+            if float_compare(sum(refunds.mapped('amount')), invoice.amount_total,
+                             precision_rounding=invoice.currency_id.rounding) < 0:
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    credit_note = invoice.with_company(invoice.company_id)._reverse_moves(
+                        [{'ref': _("Hupun refund %s", ', '.join(refunds.mapped('name')))}])
+                    refunds.write({'credit_note_id': credit_note.id})
+                credited += 1
+                detail_logs.append(f"Draft credit note for {order.name} ({', '.join(refunds.mapped('name'))})")
+            except Exception as e:
+                detail_logs.append(f"Failed to create credit note for {order.name}: {e}")
+                _logger.error(f"Failed to create credit note for {order.name}: {e}")
+        return credited
+
+    @api.model
+    @adaptive('refund')
+    def cron_sync_hupun_refunds(self):
+        """
+        Cron job importing refunds modified since the last successful run.
+        """
+        if self.env['hupun.account']._fan_out('hupun.refund', 'cron_sync_hupun_refunds'):
+            return
+
+        client = self.env['hupun.api']
+        sync_log = self.env['hupun.sync.log'].create({
+            'name': f'Refund Sync {fields.Datetime.now()}',
+            'sync_type': 'refund',
+            'status': 'running',
+        })
+        detail_logs = []
+        _logger.info("===== Hupun Refund Sync Started =====")
+
+        try:
+            start_time = fields.Datetime.now()
+            cursor = client._get_cursor('refund') or fields.Datetime.to_string(
+                start_time - datetime.timedelta(days=INITIAL_WINDOW_DAYS))
+            request_data = {'modify_time': cursor}
+            sync_log.write({'request_data': str(request_data)})
+            detail_logs.append(f"Fetching refunds modified after: {cursor}")
+
+            created_count = updated_count = skipped_count = error_count = 0
+            for page, response, items in client._iter_pages(hupun_endpoints.REFUND_QUERY, request_data):
+                if page == 1:
+                    sync_log.write({'response_data': str(response)[:5000]})
+                created, updated, skipped, errors = self._hupun_import_refunds(items, detail_logs)
+                created_count += created
+                updated_count += updated
+                skipped_count += skipped
+                error_count += errors
+                detail_logs.append(f"Page {page}: {len(items)} refunds")
+
+            # Only move the cursor forward when nothing needs to be retried
+            if not error_count:
+                client._set_cursor('refund', fields.Datetime.to_string(start_time))
+
+            if error_count and (created_count or updated_count):
+                status = 'partial'
+            elif error_count:
+                status = 'failed'
+            else:
+                status = 'success'
+            summary = f"Created: {created_count}, Updated: {updated_count}, Skipped: {skipped_count}, Errors: {error_count}"
+            sync_log.write({
+                'status': status,
+                'end_time': fields.Datetime.now(),
+                'summary': summary,
+                'record_count': created_count + updated_count,
+                'details': '\n'.join(detail_logs),
+            })
+            _logger.info(f"===== Hupun Refund Sync Completed: {summary} =====")
+
+        except Exception as e:
+            error_msg = f"Error syncing Hupun refunds: {e}"
+            _logger.error(error_msg)
+            sync_log.write({
+                'status': 'failed',
+                'end_time': fields.Datetime.now(),
+                'summary': error_msg,
+                'details': '\n'.join(detail_logs),
+            })
@@ -9,7 +9,7 @@ from hashlib import md5
 from typing import Any, Iterable, Optional, Dict
 from logging import getLogger
 
-__all__ = ['Request']
+__all__ = ['Request', 'verify']
 
 
 class Request:
@@ -31,6 +31,7 @@ class Request:
         self._sign_method = _strip(sign_method)
         self._fetch()
         self._timeout = 60
+        self._session = None
 
     def timeout(self, timeout: float):
         """
@@ -41,17 +42,27 @@ class Request:
         self._timeout = timeout
         return self
 
-    def request(self, path: str, data: Dict[str, Any]) -> Optional[str]:
+    def session(self, session):
+        """
+        设置连接会话 (复用连接池)
+        :param session: requests.Session 实例
+        :return: 请求执行类实体
+        """
+        self._session = session
+        return self
+
+    def request(self, path: str, data: Dict[str, Any], timeout: float = None) -> Optional[str]:
         """
         执行请求
         :param path: 接口路径
         :param data: 请求参数
+        :param timeout: 本次请求超时时长 (单位: 秒, 可选, 默认使用 timeout() 设置值)
         :return: 响应内容
         """
         uri = self._uri(_strip(path))
         if not uri: return
         body = self._parameters(data)
-        return self._post(uri, body)
+        return self._post(uri, body, timeout)
 
     def join_curl(self, path: str, data: Dict[str, Any], timestamp: int = None) -> str:
         """
@@ -85,7 +96,7 @@ class Request:
         self._sign(body, sign_trace)
         return _form_join(body)
 
-    def _post(self, uri, body: str):
+    def _post(self, uri, body: str, timeout: float = None):
         headers = {'Content-Type': 'application/x-www-form-urlencoded;charset=utf-8', 'Accept-Encoding': 'gzip'}
         _LOG.debug(f'Connect to {uri}')
         _LOG.debug(f'POST: {body}')
@@ -94,7 +105,10 @@ class Request:
             from gzip import compress
             headers['Content-Encoding'] = 'gzip'
             bs = compress(bs)
-        response = post(uri, data=bs, headers=headers, timeout=self._timeout)
+        send = self._session.post if self._session else post
+        response = send(uri, data=bs, headers=headers, timeout=timeout or self._timeout)
+        # 网关错误 (5xx) 抛出异常, 不把错误页当作响应内容返回
+        if response.status_code >= 500: response.raise_for_status()
         txt = response.text
         _LOG.debug(f'Response: {txt}')
         return txt
@@ -104,16 +118,7 @@ class Request:
         for s in skip:
             if s in body: del body[s]
 
-        ps = []
-        ks = sorted(body.keys())
-        for key in ks:
-            s = _url_quote_plus(key)
-            s += '='
-            value = body[key]
-            if value: s += _url_quote_plus(value)
-            ps.append(s)
-
-        join = '&'.join(ps)
+        join = _sign_join(body)
         if self._sign_method == 'hmac':
             _sign = _sign_hmac(self._secret, join)
             body[skip[0]] = self._sign_method
@@ -217,6 +222,41 @@ def _is_iterable(src) -> bool:
     return True
 
 
+def verify(secret: str, body: Dict[str, str], max_age: float = None) -> bool:
+    """
+    校验推送消息签名
+    :param secret: 应用密钥
+    :param body: 请求参数 (含 _sign, 可含 _sign_kind)
+    :param max_age: 时间戳最大偏差 (单位: 秒, 可选)
+    :return: 签名是否有效
+    """
+    import hmac
+    body = dict(body or {})
+    sign = body.pop('_sign', None)
+    kind = body.pop('_sign_kind', None)
+    if not secret or not sign: return False
+    if max_age is not None:
+        try: ts = int(body.get('_t')) / 1000
+        except (TypeError, ValueError): return False
+        if abs(time.time() - ts) > max_age: return False
+    join = _sign_join(body)
+    if kind and kind.lower() == 'hmac': expect = _sign_hmac(secret, join)
+    else: expect = _sign_md5(secret, join)
+    return hmac.compare_digest(expect, str(sign).lower())
+
+
+def _sign_join(body: Dict) -> str:
+    ps = []
+    ks = sorted(body.keys())
+    for key in ks:
+        s = _url_quote_plus(key)
+        s += '='
+        value = body[key]
+        if value: s += _url_quote_plus(value)
+        ps.append(s)
+    return '&'.join(ps)
+
+
 def _sign_hmac(secret: str, s: str) -> str:
     import hmac
     bs = hmac.new(secret.encode(_UTF8), s.encode(_UTF8), digestmod=md5)  # 计算 HmacMD5 加密值
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import functools
+import logging
+from odoo import models, fields, api
+from . import hupun_endpoints
+
+_logger = logging.getLogger(__name__)
+
+# stream -> (cron xml id, sync log type, default min minutes, default max minutes)
+STREAMS = {
+    'order': ('hupun_connector.ir_cron_sync_hupun_orders', 'order', 5, 120),
+    'refund': ('hupun_connector.ir_cron_sync_hupun_refunds', 'refund', 15, 240),
+    'product': ('hupun_connector.ir_cron_sync_products_to_hupun', 'product_push', 360, 2880),
+}
+# A run touching at least this many records means changes are piling up
+BACKLOG_THRESHOLD = 200
+
+_INTERVAL_MINUTES = {
+    'minutes': 1,
+    'hours': 60,
+    'days': 60 * 24,
+    'weeks': 60 * 24 * 7,
+    'months': 60 * 24 * 30,
+}
+
+
+def adaptive(stream):
+    """
+    Decorate a sync cron so it is skipped when a cheap probe sees no changes,
+    and its run interval follows the volume observed by the run.
+    The interval is kept in hupun.sync.state: cron ticks before the next due
+    time return at once, and a cron trigger is set at the due time. The
+    ir.cron row itself is never written, the runner holds a lock on it.
+    Runs fanned out per account probe for their own account; the interval is
+    only adjusted by the top-level run. Manual runs pass hupun_force_sync and
+    bypass the due check, the probe and the rescheduling.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            scheduler = self.env['hupun.scheduler']
+            # Manual runs neither probe nor move the schedule
+            if not scheduler._is_enabled() or self.env.context.get('hupun_force_sync'):
+                return method(self, *args, **kwargs)
+            top_level = not self.env.context.get('hupun_account_id')
+            started = fields.Datetime.now()
+            if top_level and not scheduler._is_due(stream, started):
+                return None
+            try:
+                if scheduler._has_changes(stream):
+                    result = method(self, *args, **kwargs)
+                    scheduler._set_last_run(stream, started)
+                    return result
+                scheduler._log_skip(stream)
+            finally:
+                if top_level:
+                    scheduler._reschedule(stream, started)
+        return wrapper
+    return decorator
+
+
+class HupunScheduler(models.AbstractModel):
+    _name = 'hupun.scheduler'
+    _description = 'Hupun Adaptive Scheduler'
+
+    @api.model
+    def _is_enabled(self):
+        ICP = self.env['ir.config_parameter'].sudo()
+        return ICP.get_param('hupun_connector.adaptive_scheduling', 'False') == 'True'
+
+    @api.model
+    def _bounds(self, stream):
+        ICP = self.env['ir.config_parameter'].sudo()
+        _xmlid, _sync_type, default_min, default_max = STREAMS[stream]
+        low = int(ICP.get_param(f'hupun_connector.schedule_{stream}_min', default_min) or default_min)
+        high = int(ICP.get_param(f'hupun_connector.schedule_{stream}_max', default_max) or default_max)
+        return low, max(low, high)
+
+    @api.model
+    def _get_last_run(self, stream):
+        client = self.env['hupun.api']
+        return self.env['hupun.sync.state']._get_value(client._state_key(f'schedule.{stream}.last_run'))
+
+    @api.model
+    def _set_last_run(self, stream, started):
+        client = self.env['hupun.api']
+        self.env['hupun.sync.state']._set_value(
+            client._state_key(f'schedule.{stream}.last_run'), fields.Datetime.to_string(started))
+
+    @api.model
+    def _is_due(self, stream, now):
+        next_due = self.env['hupun.sync.state']._get_value(self.env['hupun.api']._state_key(f'schedule.{stream}.next_due'))
+        return not next_due or fields.Datetime.to_datetime(next_due) <= now
+
+    @api.model
+    def _fans_out(self):
+        """True when this top-level run will be fanned out, every account then probes on its own."""
+        return not self.env.context.get('hupun_account_id') and bool(self.env['hupun.account'].sudo().search_count([]))
+
+    # --- Probes ---
+    @api.model
+    def _has_changes(self, stream):
+        """
+        Cheap check whether a run can find anything.
+        Always runs after a run that did not fully succeed, and when the
+        probe itself fails, so a skip never hides a pending retry.
+        """
+        sync_type = STREAMS[stream][1]
+        last = self.env['hupun.sync.log'].search([('sync_type', '=', sync_type)], limit=1)
+        if last and last.status != 'success':
+            return True
+        last_run = self._get_last_run(stream)
+        probe = getattr(self, f'_probe_{stream}', None)
+        if not probe or not last_run:
+            return True
+        try:
+            return probe(last_run)
+        except Exception as e:
+            _logger.warning(f"Hupun {stream} probe failed, running anyway: {e}")
+            return True
+
+    @api.model
+    def _probe_order(self, last_run):
+        """One-record query on the order window; changed when any trade was modified since the last run."""
+        if self._fans_out():
+            return True
+        client = self.env['hupun.api']
+        response = client.order_list_trades({
+            'limit': 1,
+            'page': 1,
+            'trade_status': '8',
+            'create_time': fields.Datetime.to_string(fields.Datetime.now() - datetime.timedelta(days=6)),
+            'modify_time': last_run,
+            'query_extend': {'tp_logistics_type': 0},
+        })
+        if response.get('code') != 0:
+            return True
+        data = response.get('data')
+        total = data.get('total') if isinstance(data, dict) else None
+        return bool(total) or bool(client._response_items(response))
+
+    @api.model
+    def _probe_refund(self, last_run):
+        """One-record query from the refund cursor; changed when anything was modified since."""
+        if self._fans_out():
+            return True
+        client = self.env['hupun.api']
+        cursor = client._get_cursor('refund')
+        if not cursor:
+            return True
+        response = client.make_request(hupun_endpoints.REFUND_QUERY, {'modify_time': cursor, 'page': 1, 'limit': 1})
+        return response.get('code') != 0 or bool(client._response_items(response))
+
+    @api.model
+    def _probe_product(self, last_run):
+        """Local check: any product with a Hupun code written since the last full push."""
+        return bool(self.env['product.product'].search_count(
+            [('default_code', '!=', False), ('write_date', '>', last_run)], limit=1))
+
+    # --- Interval control ---
+    @api.model
+    def _log_skip(self, stream):
+        self.env['hupun.sync.log'].create({
+            'name': f'{stream.capitalize()} Sync skipped {fields.Datetime.now()}',
+            'sync_type': STREAMS[stream][1],
+            'status': 'success',
+            'end_time': fields.Datetime.now(),
+            'summary': 'Skipped: probe found no changes',
+            'record_count': 0,
+        })
+
+    @api.model
+    def _run_logs(self, sync_type, started):
+        """(status, record_count) of the sync logs started since `started`."""
+        query = "SELECT status, record_count FROM hupun_sync_log WHERE sync_type = %s AND start_time >= %s"
+        if self._fans_out():
+            # Per-account runs committed their logs in their own cursors, after
+            # this transaction took its snapshot: read them in a fresh one
+            with self.env.registry.cursor() as cr:
+                cr.execute(query, (sync_type, started))
+                return cr.fetchall()
+        self.env['hupun.sync.log'].flush_model()
+        self.env.cr.execute(query, (sync_type, started))
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _reschedule(self, stream, started):
+        """
+        Halve the run interval when the runs since `started` hit the backlog
+        threshold or did not fully succeed, double it when they changed nothing,
+        always within the stream's configured bounds.
+        """
+        xmlid, sync_type, _default_min, _default_max = STREAMS[stream]
+        cron = self.env.ref(xmlid, raise_if_not_found=False)
+        if not cron:
+            return
+        cron = cron.sudo()
+        logs = self._run_logs(sync_type, started)
+        volume = sum(record_count or 0 for _status, record_count in logs)
+        backlog = volume >= BACKLOG_THRESHOLD or any(status in ('partial', 'failed') for status, _count in logs)
+
+        State = self.env['hupun.sync.state']
+        client = self.env['hupun.api']
+        interval_key = client._state_key(f'schedule.{stream}.interval')
+        low, high = self._bounds(stream)
+        current = int(State._get_value(interval_key) or cron.interval_number * _INTERVAL_MINUTES.get(cron.interval_type, 1))
+        if backlog:
+            interval = current // 2
+        elif not volume:
+            interval = current * 2
+        else:
+            interval = current
+        interval = min(max(interval, low), high)
+        if interval != current:
+            _logger.info(f"Hupun {stream} sync interval: {current} -> {interval} minutes (volume {volume})")
+        State._set_value(interval_key, str(interval))
+        next_due = started + datetime.timedelta(minutes=interval)
+        State._set_value(client._state_key(f'schedule.{stream}.next_due'), fields.Datetime.to_string(next_due))
+        # Ticks of the cron before next_due are skipped, the trigger covers intervals shorter than the cron's own
+        cron._trigger(at=next_due)
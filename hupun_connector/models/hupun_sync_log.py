@@ -6,12 +6,21 @@ class HupunSyncLog(models.Model):
     _name = 'hupun.sync.log'
     _description = 'Hupun Synchronization Log'
     _order = 'create_date desc'
+    _sync_type_date_idx = models.Index('(sync_type, create_date)')
 
     name = fields.Char(string='Name', required=True, default='Sync Log')
     sync_type = fields.Selection([
         ('product', 'Products'),
+        ('product_push', 'Full Product Push'),
         ('order', 'Orders'),
         ('stock', 'Stock'),
+        ('refund', 'Refunds'),
+        ('platform_bill', 'Platform Bills'),
+        ('delivery', 'Deliveries'),
+        ('purchase', 'Purchases'),
+        ('reference', 'Reference Data'),
+        ('trace', 'Logistics Traces'),
+        ('webhook', 'Webhook'),
         ('other', 'Other'),
     ], string='Sync Type', required=True, default='other')
     
@@ -25,6 +34,7 @@ class HupunSyncLog(models.Model):
     ], string='Status', default='running')
     
     summary = fields.Char(string='Summary')
+    record_count = fields.Integer(string='Records', help='Records created or changed by this run.')
     details = fields.Text(string='Details')
     
     request_data = fields.Text(string='Request Data')
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+
+
+class HupunSyncState(models.Model):
+    """
+    Small key/value store for sync bookkeeping (page fingerprints, cursors).
+    Kept out of ir.config_parameter because every set_param there clears
+    the registry caches of all workers.
+    """
+    _name = 'hupun.sync.state'
+    _description = 'Hupun Sync State'
+    _rec_name = 'key'
+
+    key = fields.Char(string='Key', required=True, readonly=True)
+    value = fields.Char(string='Value')
+
+    _key_uniq = models.Constraint('UNIQUE(key)', 'Hupun sync state keys must be unique.')
+
+    @api.model
+    def _get_value(self, key, default=None):
+        self.env.cr.execute("SELECT value FROM hupun_sync_state WHERE key = %s", (key,))
+        row = self.env.cr.fetchone()
+        return row[0] if row else default
+
+    @api.model
+    def _set_value(self, key, value):
+        self.env.cr.execute("""
+            INSERT INTO hupun_sync_state (key, value, create_uid, write_uid, create_date, write_date)
+            VALUES (%s, %s, %s, %s, now() at time zone 'UTC', now() at time zone 'UTC')
+            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date
+        """, (key, value, self.env.uid, self.env.uid))
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from typing import Dict
+
+__all__ = ['TokenBucket', 'get_bucket']
+
+# Default call budget per Hupun account (requests per second, burst size)
+DEFAULT_RATE = 10.0
+
+
+class TokenBucket:
+    """令牌桶限流 (每个账号一个, 进程内共享)"""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """阻塞直到获得一个令牌"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_BUCKETS: Dict[str, TokenBucket] = {}
+_LOCK = threading.Lock()
+
+
+def get_bucket(key: str, rate: float = None) -> TokenBucket:
+    """
+    获取账号的令牌桶
+    :param key: 账号标识 (app key)
+    :param rate: 每秒请求数, 变更时重建
+    """
+    rate = rate or DEFAULT_RATE
+    with _LOCK:
+        bucket = _BUCKETS.get(key)
+        if bucket is None or bucket.rate != rate:
+            bucket = _BUCKETS[key] = TokenBucket(rate)
+        return bucket
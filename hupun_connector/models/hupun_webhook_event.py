@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import logging
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Maximum number of queued events handled by one cron run
+BATCH_SIZE = 500
+
+
+class HupunWebhookEvent(models.Model):
+    _name = 'hupun.webhook.event'
+    _description = 'Hupun Webhook Event'
+    _order = 'id'
+
+    topic = fields.Selection([
+        ('trade', 'Trade Status'),
+        ('shipment', 'Shipment'),
+        ('refund', 'Refund'),
+        ('other', 'Other'),
+    ], string='Topic', required=True, default='other')
+    message_type = fields.Char(string='Message Type')
+    account_id = fields.Many2one('hupun.account', string='Hupun Account', readonly=True, ondelete='cascade')
+    event_key = fields.Char(string='Event Key', required=True, readonly=True)
+    payload = fields.Text(string='Payload')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    ], string='State', default='pending', required=True, index=True)
+    error = fields.Text(string='Error')
+    processed_at = fields.Datetime(string='Processed At')
+
+    _event_key_uniq = models.Constraint('UNIQUE(event_key)', 'Hupun webhook event already received.')
+
+    @api.model
+    def _topic_from_type(self, message_type):
+        message_type = (message_type or '').lower()
+        if 'refund' in message_type:
+            return 'refund'
+        if any(key in message_type for key in ('send', 'deliver', 'ship', 'logistic', 'express')):
+            return 'shipment'
+        if 'trade' in message_type or 'order' in message_type:
+            return 'trade'
+        return 'other'
+
+    @api.model
+    def _enqueue(self, params, account=None):
+        """
+        Store a verified push message. Hupun retries pushes it considers
+        unacknowledged, so duplicates are dropped on the message content hash.
+        :param account: hupun.account the push was signed for, if any
+        """
+        message_type = params.get('type') or params.get('topic') or params.get('method') or ''
+        payload = params.get('data') or params.get('content') or ''
+        event_key = hashlib.sha1(f"{params.get('_app')}\n{message_type}\n{payload}".encode('utf-8')).hexdigest()
+        self.env.cr.execute("""
+            INSERT INTO hupun_webhook_event
+                (topic, message_type, account_id, event_key, payload, state, create_uid, write_uid, create_date, write_date)
+            VALUES (%s, %s, %s, %s, %s, 'pending', %s, %s, now() at time zone 'UTC', now() at time zone 'UTC')
+            ON CONFLICT (event_key) DO NOTHING
+        """, (self._topic_from_type(message_type), message_type, account.id if account else None,
+              event_key, payload, self.env.uid, self.env.uid))
+        self._trigger_processing()
+
+    @api.model
+    def _trigger_processing(self):
+        cron = self.env.ref('hupun_connector.ir_cron_process_hupun_webhook', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+
+    def _payload_items(self):
+        """Decode the payloads of these events into a flat list of dicts."""
+        items = []
+        for event in self:
+            try:
+                data = json.loads(event.payload) if event.payload else []
+            except ValueError:
+                data = []
+            if isinstance(data, dict):
+                data = data.get('list') or data.get('trades') or [data]
+            items.extend(item for item in data if isinstance(item, dict))
+        return items
+
+    @api.model
+    def cron_process_hupun_webhook_events(self):
+        """
+        Cron job draining the webhook queue in batches, grouped by topic.
+        """
+        events = self.search([('state', '=', 'pending')], limit=BATCH_SIZE)
+        if not events:
+            return
+
+        log = self.env['hupun.sync.log'].create({
+            'name': f'Webhook Batch {fields.Datetime.now()}',
+            'sync_type': 'webhook',
+            'status': 'running',
+        })
+        details = []
+        failed = 0
+        for (topic, account), batch in events.grouped(lambda e: (e.topic, e.account_id)).items():
+            if account:
+                batch = batch.with_context(hupun_account_id=account.id).with_company(account.company_id)
+            handler = getattr(batch, f'_process_{topic}_events', None)
+            if not handler:
+                batch.write({'state': 'ignored', 'processed_at': fields.Datetime.now()})
+                details.append(f"Ignored {len(batch)} {topic} events")
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    handler(details)
+                batch.write({'state': 'done', 'processed_at': fields.Datetime.now()})
+            except Exception as e:
+                failed += len(batch)
+                _logger.error(f"Failed to process Hupun {topic} webhook events: {e}")
+                batch.write({'state': 'failed', 'error': str(e), 'processed_at': fields.Datetime.now()})
+                details.append(f"Failed {len(batch)} {topic} events: {e}")
+
+        log.write({'details': '\n'.join(details)})
+        if failed:
+            log.write({
+                'status': 'partial' if failed < len(events) else 'failed',
+                'end_time': fields.Datetime.now(),
+                'summary': f"Processed {len(events) - failed} events, {failed} failed",
+            })
+        else:
+            log.mark_success(f"Processed {len(events)} events")
+
+        # More work queued than one batch: run again right away
+        if len(events) == BATCH_SIZE:
+            self._trigger_processing()
+
+    def _process_trade_events(self, details):
+        created, updated, skipped, errors = self.env['sale.order']._hupun_import_trades(self._payload_items(), details)
+        details.append(f"Trades - Created: {created}, Updated: {updated}, Skipped: {skipped}, Errors: {errors}")
+
+    def _process_shipment_events(self, details):
+        self._process_trade_events(details)
+
+    def _process_refund_events(self, details):
+        created, updated, skipped, errors = self.env['hupun.refund']._hupun_import_refunds(self._payload_items(), details)
+        details.append(f"Refunds - Created: {created}, Updated: {updated}, Skipped: {skipped}, Errors: {errors}")
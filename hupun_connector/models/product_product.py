@@ -2,38 +2,95 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
+from odoo.tools import float_compare
+from . import hupun_endpoints
+from .hupun_api import _first
+from .hupun_scheduler import adaptive
 import json
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# Goods per goodswithspeclist page
+CATALOGUE_PAGE_SIZE = 200
+# Fields sent by _hupun_push; changing one of them queues the product in the outbox
+HUPUN_PUSH_FIELDS = {'default_code', 'name', 'barcode', 'list_price', 'lst_price'}
+
 class ProductProduct(models.Model):
     _inherit = ['product.product']
     
     is_hupun_synced = fields.Boolean(string='Synced from Hupun', default=False)
+    hupun_sku_code = fields.Char(string='Hupun SKU Code', copy=False, readonly=True,
+                                 help='Hupun SKU code, unique across all Hupun accounts: accounts sharing a '
+                                      'SKU code share the product.')
+
+    _hupun_sku_code_uniq = models.UniqueIndex('(hupun_sku_code) WHERE hupun_sku_code IS NOT NULL')
 
     def action_push_to_hupun(self):
         """
         Push product to Hupun (add or update).
         """
-        client = self.env['hupun.api']
+        success_count, fail_count = self._hupun_push_logged('product')
         
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Sync Complete'),
+                'message': _('Synced %d products, %d failed.') % (success_count, fail_count),
+                'type': 'success' if fail_count == 0 else 'warning',
+                'sticky': False,
+            }
+        }
+
+    def _hupun_push_logged(self, sync_type):
+        """
+        Push these products under a sync log of the given type.
+        :return: tuple (pushed count, failed count)
+        """
         # Create sync log
         log = self.env['hupun.sync.log'].create({
             'name': _('Product Push to Hupun'),
-            'sync_type': 'product',
+            'sync_type': sync_type,
             'start_time': fields.Datetime.now(),
             'status': 'running',
         })
         
-        success_count = 0
-        fail_count = 0
         details = []
+        pushed, failed = self._hupun_push(details)
+        success_count = len(pushed)
+        fail_count = len(failed)
         
+        # Update sync log
+        log.write({'details': '\n'.join(details), 'record_count': success_count})
+        if fail_count == 0:
+            log.mark_success(f"Synced {success_count} products successfully")
+        elif success_count == 0:
+            log.mark_failed(f"All {fail_count} products failed to sync")
+        else:
+            log.write({
+                'status': 'partial',
+                'end_time': fields.Datetime.now(),
+                'summary': f"Synced {success_count} products, {fail_count} failed"
+            })
+        return success_count, fail_count
+
+    def _hupun_push(self, details):
+        """
+        Add or update these products in Hupun.
+        :param details: list collecting human readable log lines
+        :return: tuple (pushed products, dict product id -> error message)
+        """
+        client = self.env['hupun.api']
+        pushed = self.browse()
+        failed = {}
+        # is_hupun_synced is not per account: with several accounts always look the item up
+        trust_synced = self.env['hupun.account'].sudo().search_count([]) <= 1
+
         for product in self:
             
             if not product.default_code:
-                fail_count += 1
+                failed[product.id] = "No default_code"
                 details.append(f"Skipped {product.name}: No default_code")
                 continue
             
@@ -47,66 +104,280 @@ class ProductProduct(models.Model):
             }
             
             try:
-                # Check existence
-                exists = False
-                q_resp = client.goods_query({'item_code': product.default_code, 'limit': 1, 'page': 1})
-                if q_resp and q_resp.get('data'):
-                    data = q_resp['data']
-                    if isinstance(data, dict) and data.get('list'):
-                        exists = True
-                    elif isinstance(data, list) and len(data) > 0:
-                        exists = True
+                # Check existence, products already synced are known to exist
+                exists = product.is_hupun_synced and trust_synced
+                if not exists:
+                    q_resp = client.goods_query({'item_code': product.default_code, 'limit': 1, 'page': 1})
+                    exists = bool(client._response_items(q_resp))
                 
                 if exists:
                     result = client.goods_update(params)
                     if not result or result.get('code') != 0:
-                        fail_count += 1
-                        details.append(f"Failed to update {product.default_code}: {result}")
+                        failed[product.id] = f"Failed to update {product.default_code}: {result}"
+                        details.append(failed[product.id])
                         continue
                 else:
                     result = client.goods_add(params)
                     if not result or result.get('code') != 0:
-                        fail_count += 1
-                        details.append(f"Failed to add {product.default_code}: {result}")
+                        failed[product.id] = f"Failed to add {product.default_code}: {result}"
+                        details.append(failed[product.id])
                         continue
                     
-                product.is_hupun_synced = True
-                success_count += 1
+                if not product.is_hupun_synced:
+                    product.is_hupun_synced = True
+                pushed |= product
                 details.append(f"Synced {product.default_code} successfully")
                 
             except Exception as e:
                 _logger.error("Failed to sync product %s: %s", product.default_code, e)
-                fail_count += 1
-                details.append(f"Error syncing {product.default_code}: {str(e)}")
-        
-        # Update sync log
-        log.write({'details': '\n'.join(details)})
-        if fail_count == 0:
-            log.mark_success(f"Synced {success_count} products successfully")
-        elif success_count == 0:
-            log.mark_failed(f"All {fail_count} products failed to sync")
-        else:
-            log.write({
-                'status': 'partial',
-                'end_time': fields.Datetime.now(),
-                'summary': f"Synced {success_count} products, {fail_count} failed"
-            })
-        
-        return {
-            'type': 'ir.actions.client',
-            'tag': 'display_notification',
-            'params': {
-                'title': _('Sync Complete'),
-                'message': _('Synced %d products, %d failed.') % (success_count, fail_count),
-                'type': 'success' if fail_count == 0 else 'warning',
-                'sticky': False,
-            }
-        }
+                failed[product.id] = f"Error syncing {product.default_code}: {str(e)}"
+                details.append(failed[product.id])
+
+        return pushed, failed
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        products = super().create(vals_list)
+        if not self.env.context.get('hupun_skip_outbox'):
+            self.env['hupun.product.outbox']._enqueue(products)
+        return products
+
+    def write(self, vals):
+        if 'default_code' in vals and 'is_hupun_synced' not in vals:
+            # A new internal reference is an item Hupun does not know yet, the next push must look it up again
+            renamed = self.filtered(lambda p: p.is_hupun_synced and p.default_code != vals['default_code'])
+            if renamed:
+                super(ProductProduct, renamed).write({'is_hupun_synced': False})
+        res = super().write(vals)
+        if HUPUN_PUSH_FIELDS.intersection(vals) and not self.env.context.get('hupun_skip_outbox'):
+            self.env['hupun.product.outbox']._enqueue(self)
+        return res
 
     @api.model
+    @adaptive('product')
     def cron_sync_products_to_hupun(self):
         """
         Cron job to sync products to Hupun.
+        Fanned out per account; each account gets its company's products and
+        the products shared by all companies.
+        """
+        if self.env['hupun.account']._fan_out('product.product', 'cron_sync_products_to_hupun'):
+            return
+
+        products = self.search([('default_code', '!=', False), ('company_id', 'in', [False, self.env.company.id])])
+        # Own sync type: the outbox worker and catalogue import also log as 'product'
+        products._hupun_push_logged('product_push')
+
+    @api.model
+    def _prepare_hupun_catalogue_rows(self, goods_list):
+        """Flatten Hupun goods with their specs into product values keyed by SKU code."""
+        rows = {}
+        for goods in goods_list:
+            item_name = _first(goods, 'item_name', 'goods_name') or ''
+            specs = goods.get('specs') or goods.get('spec_list') or goods.get('skus') or [goods]
+            for spec in specs:
+                sku_code = _first(spec, 'sku_code', 'spec_code', 'item_code')
+                if not sku_code:
+                    continue
+                spec_name = _first(spec, 'sku_name', 'spec_name')
+                try:
+                    price = float(_first(spec, 'sale_price', 'price') or 0)
+                except (TypeError, ValueError):
+                    price = 0.0
+                rows[sku_code] = {
+                    'name': f"{item_name} - {spec_name}" if spec_name else item_name or sku_code,
+                    'default_code': sku_code,
+                    'barcode': _first(spec, 'bar_code', 'barcode') or False,
+                    'list_price': price,
+                }
+        return rows
+
+    @api.model
+    def _hupun_products_by_sku(self, sku_codes):
+        """
+        Map Hupun SKU codes to products through the indexed hupun_sku_code.
+        Products predating that field are matched on default_code once and
+        get their key stamped.
+        """
+        Product = self.with_context(active_test=False)
+        products = {product.hupun_sku_code: product for product in Product.search([('hupun_sku_code', 'in', sku_codes)])}
+        missing = [code for code in sku_codes if code not in products]
+        if missing:
+            for product in Product.search([('hupun_sku_code', '=', False), ('default_code', 'in', missing)]):
+                if product.default_code not in products:
+                    product.hupun_sku_code = product.default_code
+                    products[product.default_code] = product
+        return products
+
+    @api.model
+    def _hupun_resolve_skus(self, skus, detail_logs):
+        """
+        Map SKU codes met in trades to products, creating the missing ones in one call.
+        When that create is rejected (e.g. duplicate barcode), products are
+        created one by one and the rejected SKUs are left out of the result.
+        :param skus: dict SKU code -> product values used on creation
+        :return: dict SKU code -> product.product
+        """
+        products = self._hupun_products_by_sku(list(skus))
+        missing = [code for code in skus if code not in products]
+        if missing:
+            Product = self.with_context(hupun_skip_outbox=True)
+            try:
+                with self.env.cr.savepoint():
+                    created = Product.create([dict(skus[code], hupun_sku_code=code) for code in missing])
+                for code, product in zip(missing, created):
+                    products[code] = product
+                    detail_logs.append(f"Created new product: {code}")
+            except Exception:
+                for code in missing:
+                    try:
+                        with self.env.cr.savepoint():
+                            products[code] = Product.create(dict(skus[code], hupun_sku_code=code))
+                        detail_logs.append(f"Created new product: {code}")
+                    except Exception as e:
+                        detail_logs.append(f"Failed to create product {code}: {e}")
+        return products
+
+    @api.model
+    def _hupun_upsert_catalogue(self, rows, details, failed=None):
+        """
+        Create or update products for one page of the catalogue.
+        Existing products are resolved by hupun_sku_code in a single query; new ones are created
+        with one multi-record create, falling back to per-record creates when
+        a record in the chunk is rejected (e.g. duplicate barcode).
+        :param failed: optional dict collecting the values of rejected SKUs by SKU code
+        :return: tuple (created, updated, errors)
+        """
+        created_count = updated_count = error_count = 0
+        existing = self._hupun_products_by_sku(list(rows))
+
+        mark_synced = self.browse()
+        for sku_code, vals in rows.items():
+            product = existing.get(sku_code)
+            if not product:
+                continue
+            changes = {
+                key: value for key, value in vals.items()
+                if (float_compare(product[key], value, precision_digits=2) != 0 if key == 'list_price' else (product[key] or False) != value)
+            }
+            if not changes:
+                if not product.is_hupun_synced:
+                    mark_synced |= product
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    product.with_context(hupun_skip_outbox=True).write(dict(changes, is_hupun_synced=True))
+                updated_count += 1
+            except Exception as e:
+                error_count += 1
+                details.append(f"Failed to update {sku_code}: {e}")
+                if failed is not None:
+                    failed[sku_code] = vals
+        if mark_synced:
+            mark_synced.write({'is_hupun_synced': True})
+
+        to_create = [
+            dict(vals, is_hupun_synced=True, hupun_sku_code=sku_code)
+            for sku_code, vals in rows.items() if sku_code not in existing
+        ]
+        if to_create:
+            try:
+                with self.env.cr.savepoint():
+                    self.with_context(hupun_skip_outbox=True).create(to_create)
+                created_count += len(to_create)
+            except Exception:
+                for vals in to_create:
+                    try:
+                        with self.env.cr.savepoint():
+                            self.with_context(hupun_skip_outbox=True).create(vals)
+                        created_count += 1
+                    except Exception as e:
+                        error_count += 1
+                        details.append(f"Failed to create {vals['default_code']}: {e}")
+                        if failed is not None:
+                            failed[vals['hupun_sku_code']] = rows[vals['hupun_sku_code']]
+        return created_count, updated_count, error_count
+
+    @api.model
+    def cron_import_hupun_catalogue(self):
+        """
+        Cron job pulling the Hupun catalogue (goods with specs) into product.product.
+        The first run loads everything, later runs only goods modified since the
+        last completed pass. Each page is committed and the ORM cache cleared so
+        memory stays bounded whatever the catalogue size. Rejected SKUs do not
+        hold the cursor back: their values are kept in a retry list and
+        upserted again on the next run, unless that run fetches them anew.
         """
-        products = self.search([('default_code', '!=', False)])
-        products.action_push_to_hupun()
+        if self.env['hupun.account']._fan_out('product.product', 'cron_import_hupun_catalogue'):
+            return
+
+        client = self.env['hupun.api']
+        sync_log = self.env['hupun.sync.log'].create({
+            'name': f'Catalogue Import {fields.Datetime.now()}',
+            'sync_type': 'product',
+            'status': 'running',
+        })
+        details = []
+        created_count = updated_count = error_count = 0
+        _logger.info("===== Hupun Catalogue Import Started =====")
+
+        try:
+            start_time = fields.Datetime.now()
+            State = self.env['hupun.sync.state']
+            retry_key = client._state_key('catalogue.retry')
+            retry_rows = json.loads(State._get_value(retry_key) or '{}')
+            failed_rows = {}
+            cursor = client._get_cursor('goods')
+            request_data = {'modify_time': cursor} if cursor else {}
+            details.append(f"Fetching goods modified after: {cursor}" if cursor else "Full catalogue load")
+            sync_log.write({'request_data': str(request_data)})
+            self.env.cr.commit()
+
+            for page, response, goods_list in client._iter_pages(
+                    hupun_endpoints.GOODS_QUERY, request_data, CATALOGUE_PAGE_SIZE, prefetch=True):
+                rows = self._prepare_hupun_catalogue_rows(goods_list)
+                created, updated, errors = self._hupun_upsert_catalogue(rows, details, failed_rows)
+                created_count += created
+                updated_count += updated
+                error_count += errors
+                for sku_code in rows:
+                    retry_rows.pop(sku_code, None)
+                self.env.cr.commit()
+                self.env.invalidate_all()
+
+            if retry_rows:
+                details.append(f"Retrying {len(retry_rows)} SKUs rejected by earlier runs")
+                created, updated, errors = self._hupun_upsert_catalogue(retry_rows, details, failed_rows)
+                created_count += created
+                updated_count += updated
+                error_count += errors
+
+            # The pass completed: move on, rejected SKUs are carried by the retry list
+            client._set_cursor('goods', fields.Datetime.to_string(start_time))
+            State._set_value(retry_key, json.dumps(failed_rows) if failed_rows else None)
+
+            summary = f"Created: {created_count}, Updated: {updated_count}, Errors: {error_count}"
+            if error_count and (created_count or updated_count):
+                status = 'partial'
+            elif error_count:
+                status = 'failed'
+            else:
+                status = 'success'
+            sync_log.write({
+                'status': status,
+                'end_time': fields.Datetime.now(),
+                'summary': summary,
+                'details': '\n'.join(details),
+            })
+            _logger.info(f"===== Hupun Catalogue Import Completed: {summary} =====")
+
+        except Exception as e:
+            self.env.cr.rollback()
+            error_msg = f"Error importing Hupun catalogue: {e}"
+            _logger.error(error_msg)
+            sync_log.write({
+                'status': 'partial' if created_count or updated_count else 'failed',
+                'end_time': fields.Datetime.now(),
+                'summary': error_msg,
+                'details': '\n'.join(details),
+            })
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models
+
+# Template fields pushed to Hupun that are not written through the variants
+HUPUN_TEMPLATE_PUSH_FIELDS = {'name', 'list_price'}
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    def write(self, vals):
+        res = super().write(vals)
+        if HUPUN_TEMPLATE_PUSH_FIELDS.intersection(vals) and not self.env.context.get('hupun_skip_outbox'):
+            self.env['hupun.product.outbox']._enqueue(self.product_variant_ids)
+        return res
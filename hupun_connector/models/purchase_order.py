@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from . import hupun_endpoints
+
+_logger = logging.getLogger(__name__)
+
+# Purchase orders confirmed within this window are exported together
+COALESCE_SECONDS = 60
+# Purchase orders loaded and exported per cron run
+EXPORT_BATCH_SIZE = 500
+# erp/purchase/add takes one bill per call, this many calls are kept in flight
+EXPORT_WORKERS = 4
+
+
+class PurchaseOrder(models.Model):
+    _inherit = 'purchase.order'
+
+    hupun_export_state = fields.Selection([
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ], string='Hupun Export', copy=False, readonly=True, index='btree_not_null')
+    hupun_bill_code = fields.Char(string='Hupun Bill Code', copy=False, readonly=True,
+                                  help='Idempotency key sent as the Hupun bill code.')
+    hupun_export_attempts = fields.Integer(string='Hupun Export Attempts', copy=False, readonly=True)
+    hupun_export_error = fields.Char(string='Hupun Export Error', copy=False, readonly=True)
+
+    def button_approve(self, force=False):
+        # Reached by direct confirmations and by two-step approvals alike
+        res = super().button_approve(force=force)
+        confirmed = self.filtered(lambda po: po.state in ('purchase', 'done') and not po.hupun_export_state)
+        for po in confirmed:
+            po.write({'hupun_export_state': 'pending', 'hupun_bill_code': f"{po.name}-{po.id}"})
+        if confirmed:
+            cron = self.env.ref('hupun_connector.ir_cron_export_hupun_purchases', raise_if_not_found=False)
+            if cron:
+                cron._trigger(at=fields.Datetime.now() + datetime.timedelta(seconds=COALESCE_SECONDS))
+        return res
+
+    def action_retry_hupun_export(self):
+        self.filtered(lambda po: po.hupun_export_state == 'failed').write({
+            'hupun_export_state': 'pending',
+            'hupun_export_error': False,
+        })
+
+    def _prepare_hupun_purchase(self):
+        self.ensure_one()
+        warehouse = self.picking_type_id.warehouse_id
+        ReferenceMap = self.env['hupun.reference.map']
+        return {
+            'bill_code': self.hupun_bill_code,
+            'supplier_code': ReferenceMap._code_for('supplier', self.partner_id) or self.partner_id.ref or self.partner_id.name,
+            'storage_code': ReferenceMap._code_for('storage', warehouse) or warehouse.code or '',
+            'remark': self.partner_ref or '',
+            'details': [{
+                'spec_code': line.product_id.hupun_sku_code or line.product_id.default_code,
+                'size': line.product_qty,
+                'price': line.price_unit,
+            } for line in self.order_line if line.product_id and not line.display_type],
+        }
+
+    @api.model
+    def _hupun_bill_exists(self, client, bill_code):
+        """Check whether an earlier attempt already created the bill in Hupun."""
+        response = client.purchase_query({'bill_code': bill_code, 'page': 1, 'limit': 1})
+        return response.get('code') == 0 and bool(client._response_items(response))
+
+    @api.model
+    def cron_export_hupun_purchases(self):
+        """
+        Cron job exporting confirmed purchase orders to Hupun.
+        Orders, lines, suppliers and warehouses are read for the whole batch
+        at once, then the calls are spread over EXPORT_WORKERS threads (HTTP only).
+        Orders that were attempted before are first looked up by bill code, so
+        a retry after a timeout never creates the bill twice. The attempt
+        counters are committed before the first call for that reason.
+        """
+        pos = self.search([('hupun_export_state', '=', 'pending')], order='id', limit=EXPORT_BATCH_SIZE)
+        if not pos:
+            return
+
+        client = self.env['hupun.api']
+        sync_log = self.env['hupun.sync.log'].create({
+            'name': f'Purchase Export {fields.Datetime.now()}',
+            'sync_type': 'purchase',
+            'status': 'running',
+        })
+        details = []
+
+        # Prefetch everything the payloads need in a few queries
+        pos.mapped('order_line.product_id.default_code')
+        pos.mapped('partner_id.ref')
+        pos.mapped('picking_type_id.warehouse_id.code')
+
+        # One client per company, each company exports with its own Hupun account
+        clients = {}
+        reqs = {}
+        failed = {}
+        for company in pos.company_id:
+            try:
+                clients[company] = client.with_company(company)
+                reqs[company] = clients[company]._get_request()
+            except UserError as e:
+                # No credentials for this company: its orders fail, the others still go out
+                clients.pop(company, None)
+                for po in pos.filtered(lambda po: po.company_id == company):
+                    failed[po.id] = str(e)
+                    po.write({'hupun_export_state': 'failed', 'hupun_export_error': str(e)[:255]})
+                details.append(f"{company.name}: {e}")
+        loaded_count = len(pos)
+        pos = pos.filtered(lambda po: po.company_id in clients)
+
+        try:
+            already_sent = pos.filtered(
+                lambda po: po.hupun_export_attempts and self._hupun_bill_exists(client.with_company(po.company_id), po.hupun_bill_code))
+        except UserError as e:
+            sync_log.mark_failed(f"Stopped, Hupun unreachable: {e}")
+            return
+        already_sent.write({'hupun_export_state': 'sent', 'hupun_export_error': False})
+        to_send = pos - already_sent
+        # References are mapped per Hupun account, resolved from each order's own company
+        payloads = {po.id: po.with_company(po.company_id)._prepare_hupun_purchase() for po in to_send}
+        for po in to_send:
+            po.hupun_export_attempts += 1
+        # The attempt must survive a worker killed mid-run, else the next run
+        # would skip the bill code lookup and post the bill a second time
+        self.env.cr.commit()
+
+        sent = self.browse()
+        with ThreadPoolExecutor(max_workers=EXPORT_WORKERS) as executor:
+            futures = {
+                po.id: executor.submit(clients[po.company_id]._sender(
+                    reqs[po.company_id], hupun_endpoints.PURCHASE_ADD, {'bill': payloads[po.id]}))
+                for po in to_send
+            }
+            for po in to_send:
+                try:
+                    response = client._read_response(futures[po.id].result)
+                except UserError as e:
+                    # Outcome unknown (e.g. timeout): stays pending, next run checks the bill code first
+                    details.append(f"{po.name}: {e}")
+                    continue
+                if response.get('code') == 0:
+                    sent |= po
+                else:
+                    failed[po.id] = response.get('message') or str(response)
+                    details.append(f"{po.name}: {failed[po.id]}")
+
+        sent.write({'hupun_export_state': 'sent', 'hupun_export_error': False})
+        for po in to_send.filtered(lambda po: po.id in failed):
+            po.write({'hupun_export_state': 'failed', 'hupun_export_error': str(failed[po.id])[:255]})
+
+        sent_count = len(sent) + len(already_sent)
+        pending_count = len(to_send.filtered(lambda po: po not in sent and po.id not in failed))
+        summary = f"Sent: {sent_count}, Failed: {len(failed)}, Still pending: {pending_count}"
+        if failed or pending_count:
+            status = 'partial' if sent_count else 'failed'
+        else:
+            status = 'success'
+        sync_log.write({
+            'status': status,
+            'end_time': fields.Datetime.now(),
+            'summary': summary,
+            'details': '\n'.join(details),
+        })
+
+        if loaded_count == EXPORT_BATCH_SIZE and sent:
+            self.env.ref('hupun_connector.ir_cron_export_hupun_purchases')._trigger()
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
-from odoo import fields, models, _
+import datetime
+from odoo import api, fields, models, _
 from odoo.exceptions import UserError
 
 class ResConfigSettings(models.TransientModel):
@@ -9,6 +10,30 @@ class ResConfigSettings(models.TransientModel):
     hupun_app_key = fields.Char(string='Hupun App Key', config_parameter='hupun_connector.app_key', default='T3487322185')
     hupun_app_secret = fields.Char(string='Hupun App Secret', config_parameter='hupun_connector.app_secret', default='b13ade5defac14295c0fd6cf706cf94e', groups='base.group_system')
     hupun_api_base_url = fields.Char(string='Hupun API Base URL', default='https://open-api.hupun.com/api', config_parameter='hupun_connector.api_base_url')
+    hupun_adaptive_scheduling = fields.Boolean(string='Adaptive Scheduling', config_parameter='hupun_connector.adaptive_scheduling')
+    hupun_schedule_order_min = fields.Integer(string='Order Sync Min Interval', default=5, config_parameter='hupun_connector.schedule_order_min')
+    hupun_schedule_order_max = fields.Integer(string='Order Sync Max Interval', default=120, config_parameter='hupun_connector.schedule_order_max')
+    hupun_schedule_refund_min = fields.Integer(string='Refund Sync Min Interval', default=15, config_parameter='hupun_connector.schedule_refund_min')
+    hupun_schedule_refund_max = fields.Integer(string='Refund Sync Max Interval', default=240, config_parameter='hupun_connector.schedule_refund_max')
+    hupun_schedule_product_min = fields.Integer(string='Product Push Min Interval', default=360, config_parameter='hupun_connector.schedule_product_min')
+    hupun_schedule_product_max = fields.Integer(string='Product Push Max Interval', default=2880, config_parameter='hupun_connector.schedule_product_max')
+    hupun_breaker_status = fields.Text(string='Hupun Gateway Status', compute='_compute_hupun_breaker_status')
+
+    @api.depends('hupun_api_base_url')
+    def _compute_hupun_breaker_status(self):
+        lines = []
+        for breaker in self.env['hupun.api']._shared_breakers():
+            line = f"{breaker['name']}: {breaker['state']} ({breaker['failures']} consecutive failures)"
+            if breaker['state'] != 'closed':
+                opened_at = datetime.datetime.fromtimestamp(breaker['opened_at']).strftime('%H:%M:%S')
+                line += f", opened at {opened_at}: {breaker['last_error']}"
+            lines.append(line)
+        status = '\n'.join(lines) or _("No Hupun breaker has changed state yet.")
+        for settings in self:
+            settings.hupun_breaker_status = status
+
+    def action_reset_hupun_breakers(self):
+        self.env['hupun.api']._reset_shared_breakers()
 
     def action_test_hupun_connection(self):
         self.ensure_one()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import re
+from odoo import models, fields, api
+from odoo.tools.sql import column_exists
+
+
+class ResPartner(models.Model):
+    _inherit = 'res.partner'
+
+    hupun_buyer_key = fields.Char(string='Hupun Buyer Key', copy=False, readonly=True,
+                                  help='Normalised buyer identity used to match Hupun buyers, '
+                                       'shared by all Hupun accounts.')
+
+    _hupun_buyer_key_uniq = models.UniqueIndex('(hupun_buyer_key) WHERE hupun_buyer_key IS NOT NULL')
+
+    def _auto_init(self):
+        backfill = not column_exists(self.env.cr, 'res_partner', 'hupun_buyer_key')
+        res = super()._auto_init()
+        if backfill:
+            # Stamp existing partners once with the key of their normalised phone
+            # (same rule as _hupun_normalize_phone), so syncs only use the index
+            self.env.cr.execute("""
+                UPDATE res_partner AS p
+                   SET hupun_buyer_key = k.key
+                  FROM (
+                    SELECT DISTINCT ON (key) id, key
+                      FROM (
+                        SELECT id, 'm:' || regexp_replace(regexp_replace(phone, '\\D', '', 'g'), '^86(\\d{11})$', '\\1') AS key
+                          FROM res_partner
+                         WHERE active AND phone IS NOT NULL
+                      ) AS candidates
+                     WHERE key != 'm:'
+                  ORDER BY key, id
+                  ) AS k
+                 WHERE p.id = k.id
+            """)
+        return res
+
+    @api.model
+    def _hupun_normalize_phone(self, phone):
+        digits = re.sub(r'\D', '', phone or '')
+        # Drop the mainland China country code so +86 138... and 138... match
+        if len(digits) == 13 and digits.startswith('86'):
+            digits = digits[2:]
+        return digits
+
+    @api.model
+    def _hupun_buyer_key(self, mobile, account, full_name):
+        """Buyer identity: normalised mobile first, then the platform account, then the display name."""
+        phone = self._hupun_normalize_phone(mobile)
+        if phone:
+            return f'm:{phone}'
+        if account:
+            return f'a:{account}'
+        return f'n:{full_name}'
+
+    @api.model
+    def _hupun_resolve_buyers(self, buyers, detail_logs):
+        """
+        Map buyer keys to partners, creating the missing ones in one call.
+        Partners that existed before hupun_buyer_key got their phone key on
+        install; others are matched once on name and get their key stamped. When the
+        multi-record create is rejected, partners are created one by one and
+        the rejected buyers are left out of the result.
+        :param buyers: dict buyer key -> partner values used on creation
+        :return: dict buyer key -> res.partner
+        """
+        partners = {partner.hupun_buyer_key: partner for partner in self.search([('hupun_buyer_key', 'in', list(buyers))])}
+
+        missing = {key: vals for key, vals in buyers.items() if key not in partners}
+        if missing:
+            names = [vals['name'] for vals in missing.values()]
+            legacy = self.search([('hupun_buyer_key', '=', False), ('name', 'in', names)])
+            by_name = {partner.name: partner for partner in legacy}
+            for key, vals in list(missing.items()):
+                partner = by_name.get(vals['name'])
+                if partner and not partner.hupun_buyer_key:
+                    partner.hupun_buyer_key = key
+                    partners[key] = partner
+                    del missing[key]
+
+        if missing:
+            try:
+                with self.env.cr.savepoint():
+                    created = self.create([dict(vals, hupun_buyer_key=key) for key, vals in missing.items()])
+                for key, partner in zip(missing, created):
+                    partners[key] = partner
+                    detail_logs.append(f"Created new partner: {partner.name}")
+            except Exception:
+                for key, vals in missing.items():
+                    try:
+                        with self.env.cr.savepoint():
+                            partners[key] = self.create(dict(vals, hupun_buyer_key=key))
+                        detail_logs.append(f"Created new partner: {vals['name']}")
+                    except Exception as e:
+                        detail_logs.append(f"Failed to create partner {vals['name']}: {e}")
+        return partners
@@ -2,38 +2,113 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
+from odoo.tools import float_compare
+from odoo.tools.sql import column_exists
+from psycopg2.extras import execute_values
+from . import hupun_endpoints
+from .hupun_api import _first
+from .hupun_scheduler import adaptive
 import datetime
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# Express codes per erp/logistic/trace/list call
+TRACE_BATCH_SIZE = 100
+# Parcels polled per cron run
+TRACE_RUN_LIMIT = 5000
+# Back-off for parcels without new events: base * 2^idle, capped
+TRACE_BASE_DELAY_MINUTES = 60
+TRACE_MAX_DELAY_MINUTES = 60 * 24
+# Parcels are given up (untracked) after this many polls without movement or past this order age
+TRACE_MAX_IDLE = 10
+TRACE_MAX_AGE_DAYS = 60
+TRACE_FINAL_STATES = ('delivered', 'exception', 'stale')
+
 class SaleOrder(models.Model):
     _name = 'sale.order'
     _inherit = ['sale.order']
 
     express_code = fields.Char(string='Hupun Tracking No')
     hupun_actual_payment = fields.Float(string='Hupun Actual Payment')
+    hupun_fingerprint = fields.Char(string='Hupun Fingerprint', copy=False, readonly=True,
+                                    help='Hash of the Hupun trade as last imported, used to skip unchanged trades.')
+    hupun_trade_no = fields.Char(string='Hupun Trade No', copy=False, readonly=True)
+    hupun_refund_ids = fields.One2many('hupun.refund', 'sale_order_id', string='Hupun Refunds')
+
+    hupun_trace_state = fields.Selection([
+        ('pending', 'Awaiting Trace'),
+        ('in_transit', 'In Transit'),
+        ('delivered', 'Delivered'),
+        ('exception', 'Exception'),
+        ('stale', 'Untracked'),
+    ], string='Parcel State', copy=False, readonly=True)
+    hupun_trace_desc = fields.Char(string='Last Trace', copy=False, readonly=True)
+    hupun_trace_time = fields.Datetime(string='Last Trace Time', copy=False, readonly=True)
+    hupun_trace_next_check = fields.Datetime(string='Next Trace Check', copy=False, readonly=True)
+    hupun_trace_idle = fields.Integer(string='Polls Without Movement', copy=False, readonly=True)
+
+    # Trade numbers are only unique within one Hupun account, i.e. one company
+    _hupun_trade_no_uniq = models.UniqueIndex('(company_id, hupun_trade_no) WHERE hupun_trade_no IS NOT NULL')
+    # Only parcels still moving are ever polled, keep that set in its own small index
+    _hupun_trace_poll_idx = models.Index(
+        "(hupun_trace_next_check) WHERE hupun_trace_state IN ('pending', 'in_transit')")
+
+    def _auto_init(self):
+        backfill = not column_exists(self.env.cr, 'sale_order', 'hupun_trace_state')
+        res = super()._auto_init()
+        if backfill:
+            # Recent orders shipped before parcel tracking existed are queued once for their first poll
+            self.env.cr.execute("""
+                UPDATE sale_order
+                   SET hupun_trace_state = 'pending', hupun_trace_next_check = now() at time zone 'UTC', hupun_trace_idle = 0
+                 WHERE express_code IS NOT NULL AND express_code != ''
+                   AND date_order >= now() at time zone 'UTC' - make_interval(days => %s)
+            """, (TRACE_MAX_AGE_DAYS,))
+        return res
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        vals_list = [self._hupun_trace_reset(vals) for vals in vals_list]
+        return super().create(vals_list)
+
+    def write(self, vals):
+        if vals.get('express_code'):
+            # Re-imports repeat the same tracking number, only a changed one restarts the trace
+            changed = self.filtered(lambda order: order.express_code != vals['express_code'])
+            if changed and changed != self:
+                return super(SaleOrder, self - changed).write(vals) and changed.write(vals)
+            if not changed:
+                return super().write(vals)
+        return super().write(self._hupun_trace_reset(vals))
+
+    @api.model
+    def _hupun_trace_reset(self, vals):
+        """A new tracking number starts a fresh trace, polled on the next run."""
+        if vals.get('express_code'):
+            vals = dict(vals, hupun_trace_state='pending', hupun_trace_desc=False, hupun_trace_time=False,
+                        hupun_trace_next_check=fields.Datetime.now(), hupun_trace_idle=0)
+        return vals
 
     def action_sync_hupun_orders(self):
         """
         Manual action to sync data for this specific order from Hupun.
         """
-        self.cron_sync_hupun_orders()
+        self.with_context(hupun_force_sync=True).cron_sync_hupun_orders()
 
     @api.model
+    @adaptive('order')
     def cron_sync_hupun_orders(self):
         """
         Cron job to sync orders from Hupun.
         Fetches orders (specifically looking for shipped ones) and updates Odoo.
         """
+        if self.env['hupun.account']._fan_out('sale.order', 'cron_sync_hupun_orders'):
+            return
+
         client = self.env['hupun.api']
         SyncLog = self.env['hupun.sync.log']
         
-        # Sync statistics
-        created_count = 0
-        updated_count = 0
-        skipped_count = 0
-        error_count = 0
         detail_logs = []
         
         # Create sync log record
@@ -50,138 +125,35 @@ class SaleOrder(models.Model):
             detail_logs.append(f"Fetching orders created after: {create_time}")
             
             request_data = {
-                'limit': 200,
-                'page': 1,
                 'trade_status': '8',
                 'create_time': create_time,
                 'query_extend': {
                     'tp_logistics_type': 0,
                 }
             }
-            response = client.order_list_trades(request_data)
-            
-            # Store request/response in sync log
-            sync_log.write({
-                'request_data': str(request_data),
-                'response_data': str(response)[:5000],  # Limit response data size
-            })
-
-            if response.get('code') != 0:
-                error_msg = f"Hupun API error: {response.get('message')}"
-                _logger.error(error_msg)
-                sync_log.mark_failed(error_msg)
-                return
-            
-            data = response.get('data')
-            items = []
-            if isinstance(data, dict) and 'list' in data:
-                items = data['list']
-            elif isinstance(data, list):
-                items = data
-            
-            detail_logs.append(f"Fetched {len(items)} orders from Hupun API")
-            _logger.info(f"Fetched {len(items)} orders from Hupun API")
-            
-            for item in items:
-                trade_no = item.get('trade_no')
-                if not trade_no:
-                    skipped_count += 1
-                    detail_logs.append(f"Skipped order with no trade_no")
-                    continue
-
-                # Find existing order
-                order = self.search([('name', '=', trade_no)], limit=1)
+            sync_log.write({'request_data': str(request_data)})
 
-                # Prepare values to sync or create with
-                vals = {}
-                if 'payment' in item:
-                    vals['hupun_actual_payment'] = float(item['payment'])
+            created_count = updated_count = skipped_count = error_count = 0
+            for page, response, items in client._iter_pages(hupun_endpoints.TRADE_OPEN_QUERY, request_data):
+                if page == 1:
+                    sync_log.write({'response_data': str(response)[:5000]})  # Limit response data size
 
-                express_code = item.get('express_code')
-                if express_code:
-                    vals['express_code'] = express_code
-
-                # If no order found, attempt to create one with minimal required fields
-                if not order:
+                unchanged, page_fingerprint = client._page_fingerprint('order', page, items)
+                if unchanged:
+                    skipped_count += len(items)
+                    detail_logs.append(f"Page {page}: unchanged since last sync, skipped {len(items)} orders")
+                    continue
 
-                    buyer = item.get('buyer')
-                    buyer_account = item.get('buyer_account')
-                    buyer_name = item.get('buyer_name')
-                    buyer_mobile = item.get('buyer_mobile')
-                    full_name = f"{buyer_name} ({buyer_account})"
-                    
-                    partner = False
-                    if buyer_mobile:
-                        partner = self.env['res.partner'].search([('phone', '=', buyer_mobile)], limit=1)
-                    
-                    if not partner and full_name:
-                        partner = self.env['res.partner'].search([('name', '=', full_name)], limit=1)
-                        
-                    if not partner:
-                        partner_vals = {
-                            'name': full_name,
-                            'phone': buyer_mobile,
-                            'comment': f'Created from Hupun order sync {buyer_account}-{ buyer }-{buyer_name}-{buyer_mobile}',
-                        }
-                        partner = self.env['res.partner'].create(partner_vals)
-                        detail_logs.append(f"Created new partner: {full_name}")
-
-                    create_vals = {
-                        'name': trade_no,
-                        'partner_id': partner.id,
-                    }
-                    
-                    # Create Order Lines
-                    lines_data = item.get('orders') or item.get('details') or []
-                    order_lines = []
-                    for line in lines_data:
-                        sku_code = line.get('sku_code')
-                        qty = float(line.get('size', 0))
-                        price = float(line.get('price', 0))
-                        
-                        product = self.env['product.product'].search([('default_code', '=', sku_code)], limit=1)
-                        if not product:
-                            # create
-                            product_vals = {
-                                'name': f"{line.get('item_name')} - {line.get('sku_name')}",
-                                'default_code': line.get('sku_code'),
-                                'barcode': line.get('bar_code'),
-                                'list_price': price,
-                            }
-                            product = self.env['product.product'].create(product_vals)
-                            detail_logs.append(f"Created new product: {sku_code}")
-
-                        if product:
-                            order_lines.append((0, 0, {
-                                'product_id': product.id,
-                                'product_uom_qty': qty,
-                                'price_unit': price,
-                                'name': line.get('title') or product.name,
-                            }))
-                    
-                    if order_lines:
-                        create_vals['order_line'] = order_lines
+                detail_logs.append(f"Page {page}: fetched {len(items)} orders from Hupun API")
+                _logger.info(f"Fetched {len(items)} orders from Hupun API (page {page})")
 
-                    create_vals.update(vals)
-                    try:
-                        order = self.create(create_vals)
-                        created_count += 1
-                        detail_logs.append(f"Created order {trade_no} with {len(order_lines)} lines")
-                    except Exception as e:
-                        error_count += 1
-                        detail_logs.append(f"Failed to create order {trade_no}: {e}")
-                        _logger.error(f"Failed to create Hupun Order {trade_no}: {e}")
-                else:
-                    # Update existing order
-                    if vals:
-                        try:
-                            order.write(vals)
-                            updated_count += 1
-                            detail_logs.append(f"Updated order {trade_no}")
-                        except Exception as e:
-                            error_count += 1
-                            detail_logs.append(f"Failed to update order {trade_no}: {e}")
-                            _logger.error(f"Failed to update Hupun Order {trade_no}: {e}")
+                created, updated, skipped, errors = self._hupun_import_trades(items, detail_logs)
+                created_count += created
+                updated_count += updated
+                skipped_count += skipped
+                error_count += errors
+                if not errors:
+                    client._store_page_fingerprint('order', page, page_fingerprint)
             
             # Determine final status
             if error_count > 0 and (created_count > 0 or updated_count > 0):
@@ -196,6 +168,7 @@ class SaleOrder(models.Model):
                 'status': status,
                 'end_time': fields.Datetime.now(),
                 'summary': summary,
+                'record_count': created_count + updated_count,
                 'details': '\n'.join(detail_logs),
             })
             _logger.info(f"===== Hupun Order Sync Completed: {summary} =====")
@@ -209,3 +182,318 @@ class SaleOrder(models.Model):
                 'summary': error_msg,
                 'details': '\n'.join(detail_logs),
             })
+
+    @api.model
+    def _hupun_import_trades(self, items, detail_logs):
+        """
+        Create or update sale orders from a list of Hupun trades.
+        Shared by the polling cron and the webhook queue.
+        :param items: list of trade dicts as returned by Hupun
+        :param detail_logs: list collecting human readable log lines
+        :return: tuple (created, updated, skipped, errors)
+        """
+        created_count = 0
+        updated_count = 0
+        skipped_count = 0
+        error_count = 0
+
+        client = self.env['hupun.api']
+        Partner = self.env['res.partner']
+        Product = self.env['product.product']
+
+        # Resolve the existing orders of the whole batch in one query
+        trade_nos = [item['trade_no'] for item in items if item.get('trade_no')]
+        orders_by_trade = self._hupun_orders_by_trade(trade_nos)
+
+        # First pass: drop unchanged trades, collect buyers and SKUs of the new ones
+        todo = []
+        buyers = {}
+        skus = {}
+        for item in items:
+            trade_no = item.get('trade_no')
+            if not trade_no:
+                skipped_count += 1
+                detail_logs.append(f"Skipped order with no trade_no")
+                continue
+
+            order = orders_by_trade.get(trade_no)
+
+            # Same content as the last import: nothing to do
+            fingerprint = client._fingerprint(item)
+            if order and order.hupun_fingerprint == fingerprint:
+                skipped_count += 1
+                continue
+            todo.append((item, fingerprint))
+            if order:
+                continue
+
+            buyer = item.get('buyer')
+            buyer_account = item.get('buyer_account')
+            buyer_name = item.get('buyer_name')
+            buyer_mobile = item.get('buyer_mobile')
+            full_name = f"{buyer_name} ({buyer_account})"
+            buyer_key = Partner._hupun_buyer_key(buyer_mobile, buyer_account, full_name)
+            buyers.setdefault(buyer_key, {
+                'name': full_name,
+                'phone': buyer_mobile,
+                'comment': f'Created from Hupun order sync {buyer_account}-{ buyer }-{buyer_name}-{buyer_mobile}',
+            })
+            for line in item.get('orders') or item.get('details') or []:
+                sku_code = line.get('sku_code')
+                if sku_code:
+                    skus.setdefault(sku_code, {
+                        'name': f"{line.get('item_name')} - {line.get('sku_name')}",
+                        'default_code': sku_code,
+                        'barcode': line.get('bar_code'),
+                        'list_price': float(line.get('price', 0)),
+                    })
+
+        partners_by_key = Partner._hupun_resolve_buyers(buyers, detail_logs) if buyers else {}
+        products_by_sku = Product._hupun_resolve_skus(skus, detail_logs) if skus else {}
+
+        for item, fingerprint in todo:
+            trade_no = item['trade_no']
+            order = orders_by_trade.get(trade_no)
+
+            # Prepare values to sync or create with
+            vals = {}
+            if 'payment' in item:
+                vals['hupun_actual_payment'] = float(item['payment'])
+
+            express_code = item.get('express_code')
+            if express_code:
+                vals['express_code'] = express_code
+
+            # If no order found, attempt to create one with minimal required fields
+            if not order:
+                full_name = f"{item.get('buyer_name')} ({item.get('buyer_account')})"
+                partner = partners_by_key.get(Partner._hupun_buyer_key(item.get('buyer_mobile'), item.get('buyer_account'), full_name))
+                lines_data = item.get('orders') or item.get('details') or []
+                # Buyer or products rejected on creation: leave the trade for the next run
+                unresolved = [line['sku_code'] for line in lines_data if line.get('sku_code') and line['sku_code'] not in products_by_sku]
+                if not partner or unresolved:
+                    error_count += 1
+                    detail_logs.append(f"Skipped order {trade_no}: " + (
+                        f"unresolved products {', '.join(unresolved)}" if partner else "buyer could not be created"))
+                    continue
+
+                create_vals = {
+                    'name': trade_no,
+                    'hupun_trade_no': trade_no,
+                    'partner_id': partner.id,
+                }
+                
+                # Create Order Lines
+                order_lines = []
+                for line in lines_data:
+                    qty = float(line.get('size', 0))
+                    price = float(line.get('price', 0))
+                    product = products_by_sku.get(line.get('sku_code'))
+                    if product:
+                        order_lines.append((0, 0, {
+                            'product_id': product.id,
+                            'product_uom_qty': qty,
+                            'price_unit': price,
+                            'name': line.get('title') or product.name,
+                        }))
+                
+                if order_lines:
+                    create_vals['order_line'] = order_lines
+
+                create_vals.update(vals, hupun_fingerprint=fingerprint)
+                try:
+                    with self.env.cr.savepoint():
+                        order = self.create(create_vals)
+                    orders_by_trade[trade_no] = order
+                    created_count += 1
+                    detail_logs.append(f"Created order {trade_no} with {len(order_lines)} lines")
+                except Exception as e:
+                    error_count += 1
+                    detail_logs.append(f"Failed to create order {trade_no}: {e}")
+                    _logger.error(f"Failed to create Hupun Order {trade_no}: {e}")
+            else:
+                # Update existing order, dropping values that are already stored
+                vals = {
+                    key: value for key, value in vals.items()
+                    if (float_compare(order[key], value, precision_digits=2) != 0 if isinstance(value, float) else order[key] != value)
+                }
+                try:
+                    order.write(dict(vals, hupun_fingerprint=fingerprint))
+                    if vals:
+                        updated_count += 1
+                        detail_logs.append(f"Updated order {trade_no}")
+                    else:
+                        skipped_count += 1
+                except Exception as e:
+                    error_count += 1
+                    detail_logs.append(f"Failed to update order {trade_no}: {e}")
+                    _logger.error(f"Failed to update Hupun Order {trade_no}: {e}")
+
+        return created_count, updated_count, skipped_count, error_count
+
+    @api.model
+    def _hupun_orders_by_trade(self, trade_nos):
+        """
+        Map Hupun trade numbers to sale orders through the indexed hupun_trade_no.
+        Orders imported before that field existed are found by name once and
+        get their key stamped, so the fallback query fades out.
+        Only orders of the current company are considered: each company syncs
+        with its own Hupun account, whose trade numbers may repeat another's.
+        """
+        trade_nos = list(set(trade_nos))
+        if not trade_nos:
+            return {}
+        company_id = self.env.company.id
+        orders = {
+            order.hupun_trade_no: order
+            for order in self.search([('company_id', '=', company_id), ('hupun_trade_no', 'in', trade_nos)])
+        }
+        missing = [trade_no for trade_no in trade_nos if trade_no not in orders]
+        if missing:
+            for order in self.search([('company_id', '=', company_id), ('hupun_trade_no', '=', False), ('name', 'in', missing)]):
+                if order.name not in orders:
+                    order.hupun_trade_no = order.name
+                    orders[order.name] = order
+        return orders
+
+    @api.model
+    def _hupun_trace_state_from(self, trace):
+        """Map a Hupun trace status onto hupun_trace_state."""
+        status = str(_first(trace, 'status', 'state', 'logistic_status') or '').lower()
+        if any(key in status for key in ('sign', 'deliver', '签收')):
+            return 'delivered'
+        if any(key in status for key in ('exception', 'reject', 'return', '异常', '拒收', '退回')):
+            return 'exception'
+        return 'in_transit'
+
+    @api.model
+    def _hupun_trace_rows(self, orders, traces, now):
+        """
+        Compute the new trace values of a batch of polled orders.
+        Parcels whose last event did not move back off exponentially, and are
+        given up as untracked after TRACE_MAX_IDLE such polls or once the
+        order is older than TRACE_MAX_AGE_DAYS.
+        :return: list of (order id, state, desc, event time, next check, idle count)
+        """
+        rows = []
+        for order in orders:
+            trace = traces.get(order.express_code)
+            events = (trace.get('traces') or trace.get('trace_list') or []) if trace else []
+            last_event = max(events, key=lambda e: str(_first(e, 'time', 'accept_time') or ''), default=None)
+            event_time = False
+            if last_event:
+                try:
+                    event_time = fields.Datetime.to_datetime(_first(last_event, 'time', 'accept_time')) or False
+                except (TypeError, ValueError):
+                    event_time = False
+            state = self._hupun_trace_state_from(trace) if trace else order.hupun_trace_state
+            moved = bool(event_time) and (not order.hupun_trace_time or event_time > order.hupun_trace_time)
+            idle = 0 if moved else order.hupun_trace_idle + 1
+            too_old = order.date_order and order.date_order < now - datetime.timedelta(days=TRACE_MAX_AGE_DAYS)
+            if state not in TRACE_FINAL_STATES and (idle >= TRACE_MAX_IDLE or too_old):
+                state = 'stale'
+            if state in TRACE_FINAL_STATES:
+                next_check = None
+            else:
+                delay = min(TRACE_BASE_DELAY_MINUTES * 2 ** idle, TRACE_MAX_DELAY_MINUTES)
+                next_check = now + datetime.timedelta(minutes=delay)
+            desc = _first(last_event, 'desc', 'context', 'remark') if last_event else None
+            rows.append((
+                order.id,
+                state,
+                (desc or order.hupun_trace_desc or None),
+                event_time or order.hupun_trace_time or None,
+                next_check,
+                idle,
+            ))
+        return rows
+
+    @api.model
+    def _hupun_write_trace_rows(self, rows):
+        """Write a batch of trace results with one UPDATE statement."""
+        if not rows:
+            return
+        execute_values(self.env.cr._obj, """
+            UPDATE sale_order AS so
+               SET hupun_trace_state = v.state,
+                   hupun_trace_desc = v.trace_desc,
+                   hupun_trace_time = v.trace_time::timestamp,
+                   hupun_trace_next_check = v.next_check::timestamp,
+                   hupun_trace_idle = v.idle
+              FROM (VALUES %s) AS v (id, state, trace_desc, trace_time, next_check, idle)
+             WHERE so.id = v.id
+        """, rows, page_size=len(rows))
+        self.invalidate_model(['hupun_trace_state', 'hupun_trace_desc', 'hupun_trace_time',
+                               'hupun_trace_next_check', 'hupun_trace_idle'])
+
+    @api.model
+    def cron_poll_hupun_traces(self):
+        """
+        Cron job polling logistics traces of parcels that are still moving.
+        Only pending / in-transit parcels due for a check are queried, in
+        batches of TRACE_BATCH_SIZE express codes, so traffic follows the
+        number of active parcels rather than the order history.
+        """
+        now = fields.Datetime.now()
+        orders = self.search([
+            ('hupun_trace_state', 'in', ('pending', 'in_transit')),
+            ('hupun_trace_next_check', '<=', now),
+            ('express_code', '!=', False),
+        ], order='hupun_trace_next_check', limit=TRACE_RUN_LIMIT)
+        if not orders:
+            return
+
+        client = self.env['hupun.api']
+        sync_log = self.env['hupun.sync.log'].create({
+            'name': f'Trace Poll {fields.Datetime.now()}',
+            'sync_type': 'trace',
+            'status': 'running',
+        })
+        details = []
+        counts = {'delivered': 0, 'exception': 0, 'stale': 0, 'moved': 0}
+        polled = 0
+
+        try:
+            # Batches never mix companies, each company polls with its own Hupun account
+            batches = [
+                company_orders[start:start + TRACE_BATCH_SIZE]
+                for company_orders in orders.grouped('company_id').values()
+                for start in range(0, len(company_orders), TRACE_BATCH_SIZE)
+            ]
+            for batch in batches:
+                response = client.with_company(batch.company_id).logistic_trace_list(
+                    {'express_codes': batch.mapped('express_code')})
+                if response.get('code') != 0:
+                    # Back off the rejected parcels too, else they stay at the head of the queue
+                    self._hupun_write_trace_rows(self._hupun_trace_rows(batch, {}, now))
+                    details.append(f"Batch of {len(batch)} rejected: {response.get('message')}")
+                    continue
+                traces = {
+                    trace.get('express_code'): trace
+                    for trace in client._response_items(response) if isinstance(trace, dict)
+                }
+                rows = self._hupun_trace_rows(batch, traces, now)
+                for row in rows:
+                    if row[1] in counts:
+                        counts[row[1]] += 1
+                    if not row[5]:
+                        counts['moved'] += 1
+                self._hupun_write_trace_rows(rows)
+                polled += len(batch)
+        except UserError as e:
+            # Gateway unreachable: parcels keep their next check and are retried next run
+            details.append(f"Stopped, Hupun unreachable: {e}")
+            _logger.error(f"Hupun trace polling interrupted: {e}")
+
+        summary = (f"Polled: {polled}, Moved: {counts['moved']}, Delivered: {counts['delivered']}, "
+                   f"Exceptions: {counts['exception']}, Untracked: {counts['stale']}")
+        sync_log.write({
+            'status': 'success' if polled == len(orders) else ('partial' if polled else 'failed'),
+            'end_time': fields.Datetime.now(),
+            'summary': summary,
+            'record_count': counts['moved'],
+            'details': '\n'.join(details),
+        })
+
+        if len(orders) == TRACE_RUN_LIMIT and polled:
+            self.env.ref('hupun_connector.ir_cron_poll_hupun_traces')._trigger()
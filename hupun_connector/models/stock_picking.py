@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import logging
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# Pickings validated within this window are pushed together
+COALESCE_SECONDS = 60
+# Trades per erp/opentrade/send/trades call
+DELIVERY_BATCH_SIZE = 100
+
+
+class StockPicking(models.Model):
+    _inherit = 'stock.picking'
+
+    hupun_delivery_state = fields.Selection([
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ], string='Hupun Delivery', copy=False, readonly=True, index='btree_not_null')
+    hupun_delivery_error = fields.Char(string='Hupun Delivery Error', copy=False, readonly=True)
+
+    def _action_done(self):
+        res = super()._action_done()
+        hupun_pickings = self.filtered(
+            lambda p: p.picking_type_code == 'outgoing' and p.sale_id.hupun_trade_no
+        )
+        if hupun_pickings:
+            hupun_pickings.write({'hupun_delivery_state': 'pending', 'hupun_delivery_error': False})
+            cron = self.env.ref('hupun_connector.ir_cron_push_hupun_deliveries', raise_if_not_found=False)
+            if cron:
+                cron._trigger(at=fields.Datetime.now() + datetime.timedelta(seconds=COALESCE_SECONDS))
+        return res
+
+    def action_retry_hupun_delivery(self):
+        self.filtered(lambda p: p.hupun_delivery_state == 'failed').write({
+            'hupun_delivery_state': 'pending',
+            'hupun_delivery_error': False,
+        })
+
+    def _prepare_hupun_delivery(self):
+        self.ensure_one()
+        return {
+            'trade_no': self.sale_id.hupun_trade_no,
+            'express_code': self.carrier_tracking_ref,
+            'logistic_name': self.carrier_id.name or '',
+        }
+
+    @api.model
+    def cron_push_hupun_deliveries(self):
+        """
+        Cron job confirming shipments to Hupun.
+        Pending pickings are sent in batches of DELIVERY_BATCH_SIZE and the
+        per-trade results of each call are mapped back onto the pickings.
+        """
+        pickings = self.search([('hupun_delivery_state', '=', 'pending')], order='id')
+        if not pickings:
+            return
+
+        client = self.env['hupun.api']
+        sync_log = self.env['hupun.sync.log'].create({
+            'name': f'Delivery Push {fields.Datetime.now()}',
+            'sync_type': 'delivery',
+            'status': 'running',
+        })
+        details = []
+        sent_count = failed_count = 0
+
+        missing = pickings.filtered(lambda p: not p.carrier_tracking_ref)
+        if missing:
+            missing.write({'hupun_delivery_state': 'failed', 'hupun_delivery_error': _('No tracking number')})
+            failed_count += len(missing)
+            details.append(f"{len(missing)} pickings have no tracking number")
+        pickings -= missing
+
+        try:
+            # Batches never mix companies, each company pushes with its own Hupun account
+            batches = [
+                company_pickings[start:start + DELIVERY_BATCH_SIZE]
+                for company_pickings in pickings.grouped('company_id').values()
+                for start in range(0, len(company_pickings), DELIVERY_BATCH_SIZE)
+            ]
+            for batch in batches:
+                response = client.with_company(batch.company_id).order_send_trades(
+                    {'trades': [picking._prepare_hupun_delivery() for picking in batch]})
+                if response.get('code') != 0:
+                    message = response.get('message') or str(response)
+                    batch.write({'hupun_delivery_state': 'failed', 'hupun_delivery_error': message[:255]})
+                    failed_count += len(batch)
+                    details.append(f"Batch of {len(batch)} rejected: {message}")
+                    continue
+
+                # Trades absent from the result list are considered accepted
+                errors = {}
+                for result in client._response_items(response):
+                    if isinstance(result, dict) and result.get('success') is False:
+                        errors[result.get('trade_no')] = result.get('message') or result.get('error') or _('Rejected by Hupun')
+                rejected = batch.filtered(lambda p: p.sale_id.hupun_trade_no in errors)
+                accepted = batch - rejected
+                for picking in rejected:
+                    picking.write({'hupun_delivery_state': 'failed', 'hupun_delivery_error': str(errors[picking.sale_id.hupun_trade_no])[:255]})
+                    details.append(f"{picking.name} ({picking.sale_id.hupun_trade_no}): {errors[picking.sale_id.hupun_trade_no]}")
+                accepted.write({'hupun_delivery_state': 'sent', 'hupun_delivery_error': False})
+                for picking in accepted:
+                    if picking.sale_id.express_code != picking.carrier_tracking_ref:
+                        picking.sale_id.express_code = picking.carrier_tracking_ref
+                sent_count += len(accepted)
+                failed_count += len(rejected)
+        except UserError as e:
+            # Gateway unreachable: leave the remaining pickings pending for the next run
+            details.append(f"Stopped, Hupun unreachable: {e}")
+            _logger.error(f"Hupun delivery push interrupted: {e}")
+
+        pending_count = len(pickings.filtered(lambda p: p.hupun_delivery_state == 'pending'))
+        summary = f"Sent: {sent_count}, Failed: {failed_count}, Still pending: {pending_count}"
+        if failed_count or pending_count:
+            status = 'partial' if sent_count else 'failed'
+        else:
+            status = 'success'
+        sync_log.write({
+            'status': status,
+            'end_time': fields.Datetime.now(),
+            'summary': summary,
+            'details': '\n'.join(details),
+        })